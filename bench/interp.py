@@ -0,0 +1,139 @@
+"""
+A small interpreter for QBE IR, used by the benchmarks to count how many
+instructions a function executes and how deep its call stack gets.
+
+It only covers what the benchmarks generate: integer arithmetic,
+comparisons, branches, calls between functions in the module, and loads and
+stores to stack slots and data. Every address holds a single value,
+whatever its type.
+"""
+
+import os
+import sys
+
+sys.path.insert(1, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src"))
+
+import qbe
+from qbe import InstrTag
+
+_ARITHMETIC = {
+    InstrTag.ADD: lambda a, b: a + b,
+    InstrTag.SUB: lambda a, b: a - b,
+    InstrTag.MUL: lambda a, b: a * b,
+    InstrTag.DIV: lambda a, b: int(a / b),
+    InstrTag.REM: lambda a, b: a - b * int(a / b),
+    InstrTag.AND: lambda a, b: a & b,
+    InstrTag.OR: lambda a, b: a | b,
+}
+
+_COMPARISONS = {
+    qbe.Comparison.SLT: lambda a, b: a < b,
+    qbe.Comparison.SLE: lambda a, b: a <= b,
+    qbe.Comparison.SEQ: lambda a, b: a == b,
+    qbe.Comparison.SNE: lambda a, b: a != b,
+    qbe.Comparison.SGT: lambda a, b: a > b,
+    qbe.Comparison.SGE: lambda a, b: a >= b,
+}
+
+
+class _Frame:
+    def __init__(self, function: qbe.Function, args: list, result):
+        self.function = function
+        self.env = {param.value: arg for (_, param), arg in zip(function.args, args)}
+        self.labels = {block.label: i for i, block in enumerate(function.body)}
+        self.block = 0
+        self.pos = 0
+
+        # Temporary the caller assigns the return value to, if any
+        self.result = result
+
+
+class Machine:
+    def __init__(self, module: qbe.Module):
+        self.functions = {function.name: function for function in module.functions}
+        self.memory = {}
+        self.globals = {}
+        self.next_address = 0
+
+        for data in module.data:
+            self.globals[data.name] = self.next_address
+            for _, item in data.items:
+                self.memory[self.next_address] = getattr(item, "value", 0)
+                self.next_address += 8
+
+        # Statistics of the last run
+        self.steps = 0
+        self.max_depth = 0
+
+    def _alloc(self, size: int) -> int:
+        address = self.next_address
+        self.next_address += max(size, 8)
+        return address
+
+    def _value(self, frame: _Frame, value):
+        match value:
+            case qbe.Temporary(name):
+                return frame.env[name]
+            case qbe.Global(name):
+                return self.globals[name]
+            case _:
+                return value.value
+
+    def run(self, name: str, args: list):
+        """
+        Calls a function, returning its result
+        """
+        self.steps = 0
+        self.max_depth = 1
+        stack = [_Frame(self.functions[name], args, None)]
+
+        while True:
+            frame = stack[-1]
+            block = frame.function.body[frame.block]
+
+            # Blocks without a jump at the end fall through to the next one
+            if frame.pos == len(block.statements):
+                frame.block += 1
+                frame.pos = 0
+                continue
+
+            statement = block.statements[frame.pos]
+            frame.pos += 1
+            self.steps += 1
+
+            target = statement.temp.value if isinstance(statement, qbe.Assign) else None
+            instr = statement.instr if isinstance(statement, qbe.Assign) else statement
+            value = lambda v: self._value(frame, v)
+
+            match instr.tag:
+                case tag if tag in _ARITHMETIC:
+                    frame.env[target] = _ARITHMETIC[tag](value(instr.args[0]), value(instr.args[1]))
+                case InstrTag.CMP:
+                    _, comparison, lhs, rhs = instr.args
+                    frame.env[target] = int(_COMPARISONS[comparison](value(lhs), value(rhs)))
+                case InstrTag.COPY:
+                    frame.env[target] = value(instr.args[0])
+                case InstrTag.ALLOC4 | InstrTag.ALLOC8 | InstrTag.ALLOC16:
+                    frame.env[target] = self._alloc(instr.args[0])
+                case InstrTag.LOAD:
+                    frame.env[target] = self.memory.get(value(instr.args[1]), 0)
+                case InstrTag.STORE:
+                    self.memory[value(instr.args[2])] = value(instr.args[1])
+                case InstrTag.JMP:
+                    frame.block, frame.pos = frame.labels[instr.args[0]], 0
+                case InstrTag.JNZ:
+                    taken = instr.args[1] if value(instr.args[0]) != 0 else instr.args[2]
+                    frame.block, frame.pos = frame.labels[taken], 0
+                case InstrTag.CALL:
+                    args = [value(arg) for _, arg in instr.args[1]]
+                    stack.append(_Frame(self.functions[instr.args[0]], args, target))
+                    self.max_depth = max(self.max_depth, len(stack))
+                case InstrTag.RET:
+                    result = None if instr.args[0] is None else value(instr.args[0])
+                    stack.pop()
+                    if len(stack) == 0:
+                        return result
+                    if frame.result is not None:
+                        stack[-1].env[frame.result] = result
+                case tag:
+                    raise RuntimeError(f"Cannot interpret {tag}")
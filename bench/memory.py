@@ -0,0 +1,69 @@
+"""
+Peak memory benchmark for large sources.
+
+Generates a synthetic source of the given size in megabytes, then compiles it
+once from stdin and once from a file path (which memory maps the source and
+parses one declaration at a time), reporting the peak RSS and time of each.
+
+    python bench/memory.py [megabytes]
+"""
+
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+MAIN = os.path.join(ROOT, "src", "main.py")
+
+SIZE = 4
+
+
+def generate(path: str, size: int):
+    with open(path, "w") as f:
+        written = 0
+        i = 0
+        while written < size:
+            decl = (
+                f"const c{i} = (1 + {i}) * 3 == {i} && true;\n"
+                f'function f{i}() {{\n  print "line {i}\\n";\n  c{i}\n}}\n'
+            )
+            f.write(decl)
+            written += len(decl)
+            i += 1
+
+
+def run(command: list[str], stdin) -> tuple[float, float]:
+    """
+    Runs a command, returning its wall time in seconds and peak RSS in megabytes
+    """
+    start = time.perf_counter()
+    process = subprocess.Popen(command, stdin=stdin, stdout=subprocess.DEVNULL)
+    _, status, usage = os.wait4(process.pid, 0)
+    elapsed = time.perf_counter() - start
+    if os.waitstatus_to_exitcode(status) != 0:
+        sys.exit(f"{' '.join(command)} failed")
+
+    # ru_maxrss is in kilobytes on Linux, and bytes on macOS
+    scale = 1 if sys.platform == "darwin" else 1024
+    return elapsed, usage.ru_maxrss * scale / (1 << 20)
+
+
+if __name__ == "__main__":
+    size = int(sys.argv[1]) if len(sys.argv) > 1 else SIZE
+
+    with tempfile.TemporaryDirectory() as tmp:
+        source = os.path.join(tmp, "big.hawk")
+        generate(source, size << 20)
+        print(f"source: {os.path.getsize(source) / (1 << 20):.1f}MB")
+
+        # Only parsing and code generation, no passes
+        command = [sys.executable, MAIN, "--passes", ""]
+
+        with open(source, "rb") as f:
+            elapsed, rss = run(command, f)
+        print(f"stdin: {elapsed:.1f}s, peak RSS {rss:.1f}MB")
+
+        elapsed, rss = run(command + [source], subprocess.DEVNULL)
+        print(f"mmap: {elapsed:.1f}s, peak RSS {rss:.1f}MB")
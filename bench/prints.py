@@ -0,0 +1,136 @@
+"""
+Print benchmark.
+
+Generates a print-heavy program and compiles it twice: once the way prints
+used to be lowered (one `printf` per print statement, each with its own
+string), and once with adjacent prints merged into a single `puts` or
+`printf("%s")` call. Reports the output calls and string literals of each.
+
+If `qbe` and a C compiler are on the path, both are also built and run with
+their output going to a pipe, reporting runtime, and the number of `write`
+system calls when `strace` is available too.
+
+    python bench/prints.py [functions] [prints per function]
+"""
+
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from collections import Counter
+
+sys.path.insert(1, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src"))
+
+import gen
+import parse
+import qbe
+
+FUNCTIONS = 200
+PRINTS = 50
+
+
+class BaselineGenerator(gen.CodeGenerator):
+    """
+    Lowers every print to its own printf, without merging any
+    """
+
+    def gen_func(self, decl):
+        coalesce, gen.coalesce_prints = gen.coalesce_prints, lambda body: body
+        try:
+            return super().gen_func(decl)
+        finally:
+            gen.coalesce_prints = coalesce
+
+    def gen_print(self, block, string):
+        block.add_instruction(qbe.Call(
+            function="printf",
+            args=[(qbe.Long, qbe.Global(self.emit_string_literal(string)))],
+            variadic_from=1
+        ))
+
+
+def source(functions: int, prints: int) -> str:
+    out = []
+    for f in range(functions):
+        body = [f'print "line {p} of f{f}\\n"' for p in range(prints)]
+
+        # Every so often a print that has to stay on its own
+        body[prints // 2] = 'print "100%%\\n"'
+        out.append(f"function f{f}() {{\n  " + ";\n  ".join(body) + "\n}\n")
+
+    return "".join(out)
+
+
+def compile(generator: gen.CodeGenerator, text: str) -> qbe.Module:
+    generator.gen(parse.parse(text))
+
+    # Call every function from main, so the programs can be run
+    calls = [qbe.Call(f.name, []) for f in generator.module.functions]
+    generator.module.add_function(qbe.Function(
+        linkage=qbe.Linkage.public(),
+        name="main",
+        args=[],
+        return_type=qbe.Word,
+        body=[qbe.Block("start", calls + [qbe.Ret(qbe.Constant(0))])],
+    ))
+
+    return generator.module
+
+
+def output_calls(module: qbe.Module) -> Counter:
+    # Each function is straight-line code, run once, so this is also the number of calls made
+    return Counter(
+        s.args[0] for f in module.functions for block in f.body for s in block.statements
+        if isinstance(s, qbe.Call) and s.args[0] in ("printf", "puts")
+    )
+
+
+def run(module: qbe.Module, tmp: str, name: str):
+    ssa, asm, exe = (os.path.join(tmp, name + ext) for ext in (".ssa", ".s", ""))
+    with open(ssa, "w") as f:
+        f.write(str(module))
+    subprocess.run(["qbe", "-o", asm, ssa], check=True)
+    subprocess.run([os.environ.get("CC", "cc"), "-o", exe, asm], check=True)
+
+    # Output to a pipe is fully buffered, like it would be in production
+    start = time.perf_counter()
+    subprocess.run([exe], check=True, stdout=subprocess.PIPE)
+    elapsed = time.perf_counter() - start
+
+    writes = "n/a"
+    if shutil.which("strace"):
+        trace = os.path.join(tmp, name + ".strace")
+        subprocess.run(["strace", "-c", "-e", "trace=write", "-o", trace, exe], check=True, stdout=subprocess.PIPE)
+        with open(trace) as f:
+            writes = next((line.split()[3] for line in f if line.rstrip().endswith("write")), "0")
+
+    return elapsed, writes
+
+
+if __name__ == "__main__":
+    functions = int(sys.argv[1]) if len(sys.argv) > 1 else FUNCTIONS
+    prints = int(sys.argv[2]) if len(sys.argv) > 2 else PRINTS
+    text = source(functions, prints)
+
+    modules = {
+        "one printf per print": compile(BaselineGenerator(), text),
+        "merged prints": compile(gen.CodeGenerator(), text),
+    }
+
+    print(f"{functions} functions with {prints} prints each")
+    for name, module in modules.items():
+        calls = output_calls(module)
+        strings = sum(1 for data in module.data if data.name.startswith("str."))
+        detail = ", ".join(f"{n} {callee}" for callee, n in sorted(calls.items()))
+        print(f"  {name:22} {sum(calls.values()):6} output calls ({detail}), {strings} strings")
+
+    if shutil.which("qbe") is None:
+        print("qbe isn't on the path, so the programs weren't run")
+        sys.exit(0)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        for i, (name, module) in enumerate(modules.items()):
+            elapsed, writes = run(module, tmp, f"prints{i}")
+            print(f"  {name:22} ran in {elapsed * 1000:.1f}ms with {writes} write calls")
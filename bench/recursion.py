@@ -0,0 +1,74 @@
+"""
+Tail-call elimination benchmark.
+
+Builds a self-recursive `f(n, acc, k)` that sums `k * 3` n times, then runs it
+through the IR interpreter before and after tail-call elimination (and loop
+invariant code motion on the loop it creates), reporting the deepest call
+stack and the number of instructions executed.
+
+    python bench/recursion.py [n]
+"""
+
+import copy
+import sys
+
+import interp
+
+import licm
+import qbe
+import tailcall
+
+DEPTH = 10000
+
+
+def recursive() -> qbe.Module:
+    n, acc, k = qbe.Temporary("n"), qbe.Temporary("acc"), qbe.Temporary("k")
+    t, c, r = qbe.Temporary("t"), qbe.Temporary("c"), qbe.Temporary("r")
+
+    module = qbe.Module()
+    module.add_function(qbe.Function(
+        linkage=qbe.Linkage.private(),
+        name="f",
+        args=[(qbe.Word, n), (qbe.Word, acc), (qbe.Word, k)],
+        return_type=qbe.Word,
+        body=[
+            qbe.Block("start", [
+                qbe.Assign(c, qbe.Word, qbe.Cmp(qbe.Word, qbe.Comparison.SGT, n, qbe.Constant(0))),
+                qbe.Jnz(c, "step", "done"),
+            ]),
+            qbe.Block("step", [
+                qbe.Assign(t, qbe.Word, qbe.Mul(k, qbe.Constant(3))),
+                qbe.Assign(qbe.Temporary("acc.next"), qbe.Word, qbe.Add(acc, t)),
+                qbe.Assign(qbe.Temporary("n.next"), qbe.Word, qbe.Sub(n, qbe.Constant(1))),
+                qbe.Assign(r, qbe.Word, qbe.Call("f", [
+                    (qbe.Word, qbe.Temporary("n.next")), (qbe.Word, qbe.Temporary("acc.next")), (qbe.Word, k),
+                ])),
+                qbe.Ret(r),
+            ]),
+            qbe.Block("done", [qbe.Ret(acc)]),
+        ],
+    ))
+
+    return module
+
+
+def report(name: str, module: qbe.Module, depth: int):
+    machine = interp.Machine(module)
+    result = machine.run("f", [depth, 0, 7])
+    assert result == depth * 21
+
+    print(f"{name:24} frames {machine.max_depth:6}  instructions {machine.steps:7}")
+
+
+if __name__ == "__main__":
+    depth = int(sys.argv[1]) if len(sys.argv) > 1 else DEPTH
+
+    module = recursive()
+    report("recursive", module, depth)
+
+    module = copy.deepcopy(module)
+    print(f"tail calls eliminated: {tailcall.eliminate_module_tail_calls(module)}")
+    report("tail calls eliminated", module, depth)
+
+    print(f"invariants hoisted: {licm.hoist_module_invariants(module)}")
+    report("and invariants hoisted", module, depth)
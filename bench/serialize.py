@@ -0,0 +1,69 @@
+"""
+Serialization benchmark.
+
+Generates a synthetic source, then compares dumping and loading its AST and
+QBE module with pickle and with `serialize`, against parsing (and generating
+code for) the source again.
+
+    python bench/serialize.py [declarations]
+"""
+
+import os
+import pickle
+import sys
+import time
+
+# Put src/ first, so it's the compiler's serialize that gets imported rather than this script
+sys.path[0] = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src")
+
+import gen
+import parse
+import serialize
+
+DECLARATIONS = 2000
+RUNS = 5
+
+
+def source(count: int) -> str:
+    return "".join(
+        f"const c{i} = (1 + {i}) * 3 == {i} && true;\n"
+        f'function f{i}() {{\n  print "line {i}\\n";\n  c{i}\n}}\n'
+        for i in range(count)
+    )
+
+
+def best_of(f) -> float:
+    best = float("inf")
+    for _ in range(RUNS):
+        start = time.perf_counter()
+        f()
+        best = min(best, time.perf_counter() - start)
+
+    return best * 1000
+
+
+def compile(text: str):
+    ast = parse.parse(text)
+    generator = gen.CodeGenerator()
+    generator.gen(ast)
+    return ast, generator.module
+
+
+if __name__ == "__main__":
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else DECLARATIONS
+    text = source(count)
+    ast, module = compile(text)
+
+    print(f"source: {count} declarations, {len(text) / 1024:.0f}KB")
+    print(f"re-parse and generate: {best_of(lambda: compile(text)):.1f}ms")
+
+    for name, value in [("ast", ast), ("module", module)]:
+        print(f"\n{name}:")
+        for fmt, dumps, loads in [
+            ("pickle", lambda v: pickle.dumps(v, pickle.HIGHEST_PROTOCOL), pickle.loads),
+            ("serialize", serialize.dumps, serialize.loads),
+        ]:
+            data = dumps(value)
+            dump_time = best_of(lambda: dumps(value))
+            load_time = best_of(lambda: loads(data))
+            print(f"  {fmt:10} {len(data) / 1024:7.0f}KB  dump {dump_time:7.1f}ms  load {load_time:7.1f}ms")
@@ -0,0 +1,75 @@
+"""
+Startup benchmark for commands that don't parse any source.
+
+Saves tests/hello.hawk as a cached module, then times
+`main.py --load <module> --passes fold` against a bare interpreter, and lists
+the slowest imports reported by `python -X importtime`. Exits with an error
+if the overhead is over the target.
+
+    python bench/startup.py
+"""
+
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+MAIN = os.path.join(ROOT, "src", "main.py")
+SOURCE = os.path.join(ROOT, "tests", "hello.hawk")
+
+# Milliseconds on top of starting the interpreter
+TARGET = 50
+RUNS = 20
+
+# Measure with bytecode cached, as it is after the first run, rather than
+# compiling every module each time
+ENV = {k: v for k, v in os.environ.items() if k != "PYTHONDONTWRITEBYTECODE"}
+
+
+def best_of(command: list[str]) -> float:
+    best = float("inf")
+    for _ in range(RUNS):
+        start = time.perf_counter()
+        subprocess.run(command, check=True, stdout=subprocess.DEVNULL, env=ENV)
+        best = min(best, time.perf_counter() - start)
+
+    return best * 1000
+
+
+def slowest_imports(command: list[str], count: int = 10) -> list[tuple[int, str]]:
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime"] + command,
+        check=True, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True, env=ENV
+    )
+
+    # Lines look like "import time:  self [us] | cumulative | name"
+    imports = []
+    for line in result.stderr.splitlines():
+        parts = line.removeprefix("import time:").split("|")
+        if len(parts) == 3 and parts[0].strip().isdigit():
+            imports.append((int(parts[0]), parts[2].strip()))
+
+    return sorted(imports, reverse=True)[:count]
+
+
+if __name__ == "__main__":
+    with tempfile.TemporaryDirectory() as tmp:
+        cached = os.path.join(tmp, "hello.nhc")
+        subprocess.run([sys.executable, MAIN, "--save", cached, SOURCE], check=True, stdout=subprocess.DEVNULL, env=ENV)
+
+        command = [MAIN, "--load", cached, "--passes", "fold"]
+        bare = best_of([sys.executable, "-c", "pass"])
+        load = best_of([sys.executable] + command)
+
+        print("slowest imports (self time):")
+        for us, name in slowest_imports(command):
+            print(f"  {us / 1000:6.1f}ms  {name}")
+
+    overhead = load - bare
+    print(f"bare interpreter: {bare:.1f}ms")
+    print(f"--load --passes fold: {load:.1f}ms ({overhead:.1f}ms over, target {TARGET}ms)")
+
+    if overhead > TARGET:
+        sys.exit(1)
@@ -0,0 +1,168 @@
+"""
+Control flow and dataflow helpers for passes over `qbe.Function`s
+"""
+
+from dataclasses import dataclass, field
+from typing import Optional
+
+import qbe
+
+
+def jump_targets(statement: qbe.Statement) -> list[str]:
+    """
+    Returns the labels a jump can go to, or an empty list for anything else
+    """
+    match statement:
+        case qbe.Jmp():
+            return [statement.args[0]]
+        case qbe.Jnz():
+            return [statement.args[1], statement.args[2]]
+        case _:
+            return []
+
+
+def is_terminator(statement: qbe.Statement) -> bool:
+    return isinstance(statement, (qbe.Jmp, qbe.Jnz, qbe.Ret))
+
+
+def successors(function: qbe.Function) -> dict[str, list[str]]:
+    """
+    Maps each block label to the labels of the blocks that can run after it.
+    A block without a jump or return falls through to the next one.
+    """
+    succs = {}
+    for i, block in enumerate(function.body):
+        last = block.statements[-1] if len(block.statements) > 0 else None
+
+        if last is not None and is_terminator(last):
+            succs[block.label] = list(dict.fromkeys(jump_targets(last)))
+        elif i + 1 < len(function.body):
+            succs[block.label] = [function.body[i + 1].label]
+        else:
+            succs[block.label] = []
+
+    return succs
+
+
+def predecessors(succs: dict[str, list[str]]) -> dict[str, list[str]]:
+    preds = {label: [] for label in succs}
+    for label, targets in succs.items():
+        for target in targets:
+            preds[target].append(label)
+
+    return preds
+
+
+def dominators(function: qbe.Function, succs: dict[str, list[str]]) -> dict[str, set[str]]:
+    """
+    Computes the set of blocks dominating each block reachable from the entry
+    """
+    if len(function.body) == 0:
+        return {}
+
+    entry = function.body[0].label
+
+    # Reverse postorder, so that the iteration converges quickly
+    order = []
+    seen = {entry}
+    stack = [(entry, iter(succs[entry]))]
+    while len(stack) > 0:
+        label, it = stack[-1]
+        target = next(it, None)
+        if target is None:
+            stack.pop()
+            order.append(label)
+        elif target not in seen:
+            seen.add(target)
+            stack.append((target, iter(succs[target])))
+    order.reverse()
+
+    preds = predecessors(succs)
+    doms = {label: set(order) for label in order}
+    doms[entry] = {entry}
+
+    changed = True
+    while changed:
+        changed = False
+        for label in order[1:]:
+            new = set.intersection(*[doms[p] for p in preds[label] if p in doms]) | {label}
+            if new != doms[label]:
+                doms[label] = new
+                changed = True
+
+    return doms
+
+
+@dataclass
+class Loop:
+    # Label of the block every iteration starts at
+    header: str
+
+    # Labels of every block in the loop, including the header
+    blocks: set[str] = field(default_factory=set)
+
+
+def natural_loops(function: qbe.Function) -> list[Loop]:
+    """
+    Finds natural loops from back edges (edges to a block that dominates the
+    source). Loops sharing a header are merged. Inner loops come before the
+    loops that contain them.
+    """
+    succs = successors(function)
+    preds = predecessors(succs)
+    doms = dominators(function, succs)
+
+    loops = {}
+    for label in doms:
+        for target in succs[label]:
+            if target not in doms[label]:
+                continue
+
+            loop = loops.setdefault(target, Loop(header=target, blocks={target}))
+
+            # Walk backwards from the latch until reaching the header
+            stack = [label]
+            while len(stack) > 0:
+                block = stack.pop()
+                if block not in loop.blocks and block in doms:
+                    loop.blocks.add(block)
+                    stack.extend(preds[block])
+
+    return sorted(loops.values(), key=lambda loop: len(loop.blocks))
+
+
+def is_alloc(statement: qbe.Statement) -> bool:
+    return isinstance(statement, qbe.Assign) and statement.instr.tag in (
+        qbe.InstrTag.ALLOC4,
+        qbe.InstrTag.ALLOC8,
+        qbe.InstrTag.ALLOC16,
+    )
+
+
+def _temporaries(value, out: list):
+    match value:
+        case qbe.Temporary():
+            out.append(value)
+        case list() | tuple():
+            for v in value:
+                _temporaries(v, out)
+
+
+def uses(statement: qbe.Statement) -> list[qbe.Temporary]:
+    """
+    Returns the temporaries a statement reads
+    """
+    out = []
+    instr = statement.instr if isinstance(statement, qbe.Assign) else statement
+    _temporaries(instr.args, out)
+    return out
+
+
+def definition(statement: qbe.Statement) -> Optional[qbe.Temporary]:
+    """
+    Returns the temporary a statement writes, if any
+    """
+    if isinstance(statement, qbe.Assign):
+        return statement.temp
+
+    return None
@@ -0,0 +1,230 @@
+from dataclasses import dataclass
+
+import qbe
+
+
+@dataclass
+class FoldStats:
+    # Number of functions removed
+    functions: int = 0
+
+    # Number of data definitions removed
+    data: int = 0
+
+    # Size of the IR text that was removed
+    bytes_saved: int = 0
+
+
+class _Canonicalizer:
+    """
+    Builds a hashable key for a definition, with temporaries and labels renamed
+    in order of first appearance so that only the shape of the code matters.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self.temps = {}
+        self.labels = {}
+
+    def temp(self, name: str):
+        return self.temps.setdefault(name, len(self.temps))
+
+    def label(self, name: str):
+        return self.labels.setdefault(name, len(self.labels))
+
+    def value(self, value):
+        match value:
+            case qbe.Temporary(name):
+                return ("%", self.temp(name))
+            case qbe.Global(name) if name == self.name:
+                return ("$", None)
+            case list() | tuple():
+                return tuple(self.value(v) for v in value)
+            case _:
+                return str(value)
+
+    def instruction(self, instr: qbe.Instruction):
+        match instr.tag:
+            case qbe.InstrTag.JMP:
+                return (instr.tag, self.label(instr.args[0]))
+            case qbe.InstrTag.JNZ:
+                return (instr.tag, self.value(instr.args[0]), self.label(instr.args[1]), self.label(instr.args[2]))
+            case qbe.InstrTag.CALL:
+                callee = None if instr.args[0] == self.name else instr.args[0]
+                return (instr.tag, callee, self.value(instr.args[1]), instr.args[2])
+            case _:
+                return (instr.tag, self.value(instr.args))
+
+    def statement(self, statement):
+        if isinstance(statement, qbe.Assign):
+            return (self.value(statement.temp), str(statement.ty), self.instruction(statement.instr))
+
+        return self.instruction(statement)
+
+    def function(self, function: qbe.Function):
+        return (
+            str(function.linkage),
+            str(function.return_type),
+            tuple((str(ty), self.value(temp)) for ty, temp in function.args),
+            tuple(
+                (self.label(block.label), tuple(self.statement(s) for s in block.statements))
+                for block in function.body
+            ),
+        )
+
+    def data(self, data: qbe.DataDef):
+        return (
+            str(data.linkage),
+            data.align,
+            tuple(
+                (str(ty), ("$", item.offset) if isinstance(item, qbe.Symbol) and item.symbol == self.name else str(item))
+                for ty, item in data.items
+            ),
+        )
+
+
+# Library functions that only ever read through the pointers they are given
+READ_ONLY_CALLS = {"printf", "fputs", "puts"}
+
+
+def _globals(value, out: list):
+    match value:
+        case qbe.Global(name):
+            out.append(name)
+        case list() | tuple():
+            for v in value:
+                _globals(v, out)
+
+
+def _read_only_data(module: qbe.Module) -> set[str]:
+    """
+    Finds data that is only ever read, either by a load straight from its
+    symbol or by being passed to one of `READ_ONLY_CALLS`. Anything else, like
+    a store, a blit or pointer arithmetic, might let the program write to it,
+    and then sharing it between definitions would be visible.
+    """
+    names = {data.name for data in module.data}
+    written = set()
+
+    for function in module.functions:
+        for block in function.body:
+            for statement in block.statements:
+                instr = statement.instr if isinstance(statement, qbe.Assign) else statement
+                match instr.tag:
+                    case qbe.InstrTag.LOAD:
+                        args = instr.args[2:]
+                    case qbe.InstrTag.CALL if instr.args[0] in READ_ONLY_CALLS:
+                        args = ()
+                    case _:
+                        args = instr.args
+
+                found = []
+                _globals(args, found)
+                written.update(found)
+
+    # Data pointing at other data could be used to reach it
+    for data in module.data:
+        for _, item in data.items:
+            if isinstance(item, qbe.Symbol):
+                written.add(item.symbol)
+
+    return names - written
+
+
+def _fold(definitions: list, key, stats: FoldStats, foldable=lambda d: True) -> dict[str, str]:
+    """
+    Keeps one copy of each group of identical definitions, returning a mapping
+    from the names of removed definitions to the name of the copy that was kept.
+
+    Exported definitions are never removed, as other objects may refer to them.
+    """
+    groups = {}
+    for definition in definitions:
+        if foldable(definition):
+            groups.setdefault(key(definition), []).append(definition)
+
+    renames = {}
+    removed = set()
+    for group in groups.values():
+        if len(group) < 2:
+            continue
+
+        kept = next((d for d in group if d.linkage.exported), group[0])
+        for definition in group:
+            if definition is kept or definition.linkage.exported:
+                continue
+
+            renames[definition.name] = kept.name
+            removed.add(id(definition))
+            stats.bytes_saved += len(str(definition))
+
+    definitions[:] = [d for d in definitions if id(d) not in removed]
+
+    return renames
+
+
+def _redirect_value(value, renames: dict[str, str]):
+    match value:
+        case qbe.Global(name) if name in renames:
+            return qbe.Global(renames[name])
+        case list():
+            return [_redirect_value(v, renames) for v in value]
+        case tuple():
+            return tuple(_redirect_value(v, renames) for v in value)
+        case _:
+            return value
+
+
+def _redirect_instruction(instr: qbe.Instruction, renames: dict[str, str]):
+    args = _redirect_value(instr.args, renames)
+    if instr.tag == qbe.InstrTag.CALL and args[0] in renames:
+        args = (renames[args[0]],) + args[1:]
+
+    instr.args = args
+
+
+def _redirect(module: qbe.Module, renames: dict[str, str]):
+    """
+    Points every reference to a removed definition at the copy that was kept
+    """
+    if len(renames) == 0:
+        return
+
+    for function in module.functions:
+        for block in function.body:
+            for statement in block.statements:
+                if isinstance(statement, qbe.Assign):
+                    _redirect_instruction(statement.instr, renames)
+                else:
+                    _redirect_instruction(statement, renames)
+
+    for data in module.data:
+        data.items = [
+            (ty, qbe.Symbol(renames[item.symbol], item.offset))
+            if isinstance(item, qbe.Symbol) and item.symbol in renames else (ty, item)
+            for ty, item in data.items
+        ]
+
+
+def fold_module(module: qbe.Module) -> FoldStats:
+    """
+    Removes byte-identical functions and data definitions from a module.
+
+    Data is folded first, so that functions which only differed in the
+    constants they refer to can be folded afterwards. Only data the program
+    never writes to is folded.
+    """
+    stats = FoldStats()
+
+    read_only = _read_only_data(module)
+    count = len(module.data)
+    renames = _fold(module.data, lambda d: _Canonicalizer(d.name).data(d), stats, lambda d: d.name in read_only)
+    stats.data = count - len(module.data)
+    _redirect(module, renames)
+
+    count = len(module.functions)
+    renames = _fold(module.functions, lambda f: _Canonicalizer(f.name).function(f), stats)
+    stats.functions = count - len(module.functions)
+    _redirect(module, renames)
+
+    return stats
@@ -8,6 +8,9 @@ class CodeGenerator:
     def __init__(self):
         self.module = qbe.Module()
 
+        # Name of the "%s" format string, once something has used it
+        self.string_format = None
+
     def gen(self, ast: list[tree.ConstantDeclaration | tree.FunctionDeclaration]):
       for decl in ast:
         if isinstance(decl, tree.ConstantDeclaration):
@@ -48,16 +51,39 @@ class CodeGenerator:
 
         return name
 
+    def gen_print(self, block: qbe.Block, string: str):
+        if '%' in string:
+            block.add_instruction(qbe.Call(
+                function="printf",
+                args=[(qbe.Long, qbe.Global(self.emit_string_literal(string)) )],
+                variadic_from=1
+            ))
+            return
+
+        # No format specifiers, so skip parsing the string as a format. `stdout`
+        # is named differently by each libc, so stick to calls that don't need it.
+        if _ends_with_newline(string):
+            # puts adds the newline back
+            block.add_instruction(qbe.Call(
+                function="puts",
+                args=[(qbe.Long, qbe.Global(self.emit_string_literal(string[:-2])))]
+            ))
+            return
+
+        if self.string_format is None:
+            self.string_format = self.emit_string_literal('%s')
+
+        block.add_instruction(qbe.Call(
+            function="printf",
+            args=[(qbe.Long, qbe.Global(self.string_format)), (qbe.Long, qbe.Global(self.emit_string_literal(string)))],
+            variadic_from=1
+        ))
+
     def gen_func(self, decl: tree.FunctionDeclaration):
         block = qbe.Block(label='entry', statements=[])
-        for stmt in decl.body:
+        for stmt in coalesce_prints(decl.body):
             if isinstance(stmt, tree.PrintStatement):
-              literal = self.emit_string_literal(stmt.string)
-
-              block.add_instruction(qbe.Call(
-                  function="printf",
-                  args=[(qbe.Long, qbe.Global(literal) )]
-              ))
+              self.gen_print(block, stmt.string)
           
         block.add_instruction(qbe.Ret())
                 
@@ -67,4 +93,32 @@ class CodeGenerator:
             args=[],
             return_type=None,
             body=[block]
-        )
\ No newline at end of file
+        )
+
+
+def _ends_with_newline(string: str) -> bool:
+    # The string is still escaped, so the last `n` must follow an odd number of backslashes
+    if not string.endswith('n'):
+        return False
+
+    backslashes = len(string) - 1 - len(string[:-1].rstrip('\\'))
+    return backslashes % 2 == 1
+
+
+def coalesce_prints(body: list[tree._Statement]) -> list[tree._Statement]:
+    """
+    Merges runs of adjacent print statements into a single print, so each run
+    becomes one output call and one string literal.
+
+    Prints containing a `%` are left alone, as each one is its own printf
+    format string and joining them could change what the specifiers read.
+    """
+    out = []
+    for stmt in body:
+        mergeable = isinstance(stmt, tree.PrintStatement) and '%' not in stmt.string
+        if mergeable and len(out) > 0 and isinstance(out[-1], tree.PrintStatement) and '%' not in out[-1].string:
+            out[-1] = tree.PrintStatement(out[-1].string + stmt.string)
+        else:
+            out.append(stmt)
+
+    return out
@@ -0,0 +1,158 @@
+import cfg
+import qbe
+
+
+# Instructions without side effects that can't trap, so they can run even on
+# paths where the loop wouldn't have run them
+PURE = {
+    qbe.InstrTag.ADD,
+    qbe.InstrTag.SUB,
+    qbe.InstrTag.MUL,
+    qbe.InstrTag.AND,
+    qbe.InstrTag.OR,
+    qbe.InstrTag.CMP,
+    qbe.InstrTag.COPY,
+}
+
+# Instructions that may write to memory
+CLOBBERS = {
+    qbe.InstrTag.STORE,
+    qbe.InstrTag.BLIT,
+    qbe.InstrTag.CALL,
+}
+
+
+def _instr(statement: qbe.Statement) -> qbe.Instruction:
+    return statement.instr if isinstance(statement, qbe.Assign) else statement
+
+
+def _preheader(function: qbe.Function, loop: cfg.Loop) -> qbe.Block:
+    """
+    Inserts a block that runs once before the loop, right before its header,
+    and sends every edge entering the loop from outside through it
+    """
+    index = next(i for i, block in enumerate(function.body) if block.label == loop.header)
+    header = function.body[index]
+    preheader = qbe.Block(label=f"{header.label}.pre", statements=[])
+
+    for block in function.body:
+        if block.label in loop.blocks or len(block.statements) == 0:
+            continue
+
+        last = block.statements[-1]
+        if isinstance(last, qbe.Jmp) and last.args[0] == header.label:
+            last.args = (preheader.label,)
+        elif isinstance(last, qbe.Jnz):
+            last.args = tuple(preheader.label if arg == header.label else arg for arg in last.args)
+
+    if index == 0:
+        # Stack allocations have to stay in the entry block
+        while len(header.statements) > 0 and cfg.is_alloc(header.statements[0]):
+            preheader.add_instruction(header.statements.pop(0))
+    else:
+        # A block from inside the loop falling through into the header would
+        # otherwise fall into the preheader
+        previous = function.body[index - 1]
+        falls_through = len(previous.statements) == 0 or not cfg.is_terminator(previous.statements[-1])
+        if previous.label in loop.blocks and falls_through:
+            previous.add_instruction(qbe.Jmp(header.label))
+
+    function.body.insert(index, preheader)
+
+    return preheader
+
+
+def hoist_loop(function: qbe.Function, loop: cfg.Loop) -> int:
+    """
+    Moves invariant computations out of a single loop, returning how many were moved.
+
+    A statement is invariant when it is the only definition of its temporary
+    and all its operands are defined outside the loop (or are invariant
+    themselves). Loads are only moved when nothing in the loop can write to
+    memory, and the load runs on every trip through the loop.
+    """
+    blocks = [block for block in function.body if block.label in loop.blocks]
+
+    # Count definitions of every temporary, and which ones happen inside the loop
+    defs = {}
+    for _, temp in function.args:
+        defs[temp.value] = defs.get(temp.value, 0) + 1
+    for block in function.body:
+        for statement in block.statements:
+            temp = cfg.definition(statement)
+            if temp is not None:
+                defs[temp.value] = defs.get(temp.value, 0) + 1
+
+    inside = set()
+    clobbered = False
+    for block in blocks:
+        for statement in block.statements:
+            temp = cfg.definition(statement)
+            if temp is not None:
+                inside.add(temp.value)
+            if _instr(statement).tag in CLOBBERS:
+                clobbered = True
+
+    # Blocks that run on every iteration dominate every block leaving the loop
+    succs = cfg.successors(function)
+    doms = cfg.dominators(function, succs)
+    exits = [label for label in loop.blocks if any(t not in loop.blocks for t in succs[label])]
+    always = {label for label in loop.blocks if all(label in doms.get(e, ()) for e in exits)}
+
+    hoisted = []
+    changed = True
+    while changed:
+        changed = False
+        for block in blocks:
+            kept = []
+            for statement in block.statements:
+                if _is_invariant(statement, block.label, defs, inside, clobbered, always):
+                    inside.discard(statement.temp.value)
+                    hoisted.append(statement)
+                    changed = True
+                else:
+                    kept.append(statement)
+            block.statements = kept
+
+    if len(hoisted) > 0:
+        preheader = _preheader(function, loop)
+        preheader.statements.extend(hoisted)
+        preheader.add_instruction(qbe.Jmp(loop.header))
+
+    return len(hoisted)
+
+
+def _is_invariant(statement, label, defs, inside, clobbered, always) -> bool:
+    if not isinstance(statement, qbe.Assign) or defs[statement.temp.value] != 1:
+        return False
+
+    tag = statement.instr.tag
+    if tag == qbe.InstrTag.LOAD:
+        if clobbered or label not in always:
+            return False
+    elif tag not in PURE:
+        return False
+
+    return all(temp.value not in inside for temp in cfg.uses(statement))
+
+
+def hoist_invariants(function: qbe.Function) -> int:
+    """
+    Runs loop-invariant code motion over every loop in a function, innermost
+    loops first, so code can move out through several levels of nesting
+    """
+    count = 0
+    done = set()
+
+    while True:
+        # Preheaders change the block graph, so find the loops again each time
+        loops = [loop for loop in cfg.natural_loops(function) if loop.header not in done]
+        if len(loops) == 0:
+            return count
+
+        done.add(loops[0].header)
+        count += hoist_loop(function, loops[0])
+
+
+def hoist_module_invariants(module: qbe.Module) -> int:
+    return sum(hoist_invariants(function) for function in module.functions)
@@ -1,34 +1,124 @@
-from lark import Lark, ast_utils
+import getopt
+import importlib
 import sys
 
-import gen
-import tree
 
+# Optimization passes over a whole module, in the order they run. Each one is
+# a module and function name, so only the passes that run get imported.
+PASSES = {
+    'tailcall': ('tailcall', 'eliminate_module_tail_calls'),
+    'licm': ('licm', 'hoist_module_invariants'),
+    'peephole': ('peephole', 'optimize_module'),
+    'slots': ('slots', 'color_module_slots'),
+    'fold': ('fold', 'fold_module'),
+}
 
-parser = Lark.open('./src/nighthawk.lark', parser='lalr')
 
-transformer = ast_utils.create_transformer(tree, tree.ToAst())
+def run_pass(name, module):
+    module_name, function = PASSES[name]
+    return getattr(importlib.import_module(module_name), function)(module)
 
 
-def parse(text):
-    parse_tree = parser.parse(text)
-    ast = []
+def generate(path):
+    # Lark is slow to import, so only load the parser when there's source to parse
+    import gen
+    import parse
 
-    for decl in parse_tree.children:
-        ast.append(transformer.transform(decl))
+    if path is None:
+        # Read stdin input from pipe
+        parsed = parse.parse(sys.stdin.read())
+    else:
+        parsed = parse.parse_file(path)
+
+    generator = gen.CodeGenerator()
+
+    # Generate each declaration as it's parsed, so its AST can be freed straight away
+    for decl in parsed:
+        generator.gen([decl])
+
+    return generator.module
+
+
+# argparse takes longer to import than loading a cached module, so the
+# options are parsed with getopt instead
+USAGE = 'usage: main.py [options] [source]'
+
+
+def help_text():
+    # Only needed for --help, so it's fine to import the pass for its path
+    from pgo import PROFILE_PATH
+
+    return f"""{USAGE}
+
+nighthawk compiler, reads source from stdin (or the source file) and prints QBE IR
+
+options:
+  -h, --help           show this help message and exit
+  --load PATH          load a serialized module instead of parsing stdin
+  --save PATH          save the optimized module
+  --instrument         count how often each block runs, writing the counts to {PROFILE_PATH} at exit
+  --profile-use PATH   optimize using counts from an instrumented run
+  --passes PASSES      comma separated passes to run (default: {','.join(PASSES)})
+  --stats              print what each pass did to stderr"""
 
-    return ast
+
+def usage_error(message):
+    print(USAGE, file=sys.stderr)
+    print(f'main.py: error: {message}', file=sys.stderr)
+    sys.exit(2)
 
 
 if __name__ == '__main__':
-    # Read stdin input from pipe
-    text = sys.stdin.read()
+    try:
+        opts, rest = getopt.gnu_getopt(
+            sys.argv[1:], 'h', ['help', 'load=', 'save=', 'instrument', 'profile-use=', 'passes=', 'stats']
+        )
+    except getopt.GetoptError as e:
+        usage_error(e.msg)
 
-    parsed = parse(text)
+    opts = dict(opts)
+    if '-h' in opts or '--help' in opts:
+        print(help_text())
+        sys.exit(0)
+    if len(rest) > 1:
+        usage_error(f"unrecognized arguments: {' '.join(rest[1:])}")
 
-    print(parsed)
+    source = rest[0] if len(rest) > 0 else None
+    load = opts.get('--load')
+    save = opts.get('--save')
+    profile_use = opts.get('--profile-use')
+    stats = '--stats' in opts
 
-    generator = gen.CodeGenerator()
-    generator.gen(parsed)
+    passes = [name for name in opts.get('--passes', ','.join(PASSES)).split(',') if name != '']
+    for name in passes:
+        if name not in PASSES:
+            usage_error(f"unknown pass '{name}' (choose from {', '.join(PASSES)})")
+
+    if load is not None:
+        import serialize
+
+        module = serialize.load(load)
+    else:
+        module = generate(source)
+
+    # Both of these have to see the module as generated, so labels line up
+    if '--instrument' in opts:
+        import pgo
+
+        pgo.instrument(module)
+    if profile_use is not None:
+        import pgo
+
+        pgo.apply_profile(module, pgo.read_profile(profile_use))
+
+    for name in passes:
+        result = run_pass(name, module)
+        if stats:
+            print(f'{name}: {result}', file=sys.stderr)
+
+    if save is not None:
+        import serialize
+
+        serialize.dump(module, save)
 
-    print(str(generator.module))
+    print(str(module))
@@ -0,0 +1,167 @@
+import inspect
+import mmap
+import os
+import re
+import stat
+
+from lark import Lark, Transformer, UnexpectedInput, ast_utils, v_args
+
+import tree
+
+
+GRAMMAR = os.path.join(os.path.dirname(__file__), 'nighthawk.lark')
+
+
+class ToAst(Transformer):
+    # Define extra transformation functions, for rules that don't correspond to an AST class.
+
+    def STRING(self, s):
+        # Remove quotation marks
+        return s[1:-1]
+
+    def number(self, tok):
+        n = tok[0]
+        match n.type:
+            case "python__DEC_NUMBER":
+                return int(n)
+            case "python__HEX_NUMBER":
+                return int(n, 16)
+            case "python__OCT_NUMBER":
+                return int(n, 8)
+            case "python__BIN_NUMBER":
+                return int(n, 2)
+            case "python__FLOAT_NUMBER":
+                return float(n)
+
+    def NAME(self, n):
+        return tree.Name(n.value)
+
+    @v_args(inline=True)
+    def start(self, x):
+        return x
+
+
+def create_transformer() -> Transformer:
+    """
+    Same as `ast_utils.create_transformer`, but collects subclasses of `tree._Ast`,
+    so that `tree` doesn't have to import lark.
+    """
+    t = ToAst()
+
+    for name, obj in inspect.getmembers(tree):
+        if not name.startswith('_') and inspect.isclass(obj) and issubclass(obj, tree._Ast):
+            setattr(t, ast_utils.camel_to_snake(name), v_args(inline=True)(obj).__get__(t))
+
+    return t
+
+
+parser = Lark.open(GRAMMAR, parser='lalr')
+
+transformer = create_transformer()
+
+
+def parse(text):
+    parse_tree = parser.parse(text)
+    ast = []
+
+    for decl in parse_tree.children:
+        ast.append(transformer.transform(decl))
+
+    return ast
+
+
+# Braces, declaration terminators, and string literals (which may contain either)
+_BOUNDARY = re.compile(rb'"(?:[^"\\\n]|\\.)*"|\'(?:[^\'\\\n]|\\.)*\'|[{};]')
+
+
+def split_declarations(buf):
+    """
+    Splits source into the text of each top-level declaration, decoding one
+    declaration at a time. A constant ends at a `;` and a function at the `}`
+    that closes its body.
+
+    Yields the line and column each declaration starts at along with its text,
+    so that errors can point into the whole file.
+    """
+    depth = 0
+    start = 0
+    line = 1
+    column = 1
+
+    def chunk(end):
+        nonlocal start, line, column
+
+        text = buf[start:end].decode('utf-8')
+        position = (line, column, text)
+
+        newline = text.rfind('\n')
+        if newline == -1:
+            column += len(text)
+        else:
+            line += text.count('\n')
+            column = len(text) - newline
+        start = end
+
+        return position
+
+    for token in _BOUNDARY.finditer(buf):
+        match buf[token.start()]:
+            case 0x7b: # {
+                depth += 1
+            case 0x7d: # }
+                depth -= 1
+                if depth == 0:
+                    yield chunk(token.end())
+            case 0x3b if depth == 0: # ;
+                yield chunk(token.end())
+
+    if buf[start:].strip() != b'':
+        # Let the parser report whatever is left over
+        yield chunk(len(buf))
+
+
+def _shift(error, line, column):
+    """
+    Moves the position of an error in one declaration to where the declaration
+    starts in the file, along with any lexer error it was raised from
+    """
+    while isinstance(error, UnexpectedInput):
+        # The end of input has no position
+        if isinstance(error.line, int) and error.line > 0:
+            if error.line == 1:
+                error.column += column - 1
+            error.line += line - 1
+
+        error = error.__context__
+
+
+def _parse_declarations(buf):
+    for line, column, text in split_declarations(buf):
+        try:
+            ast = parse(text)
+        except UnexpectedInput as e:
+            _shift(e, line, column)
+            raise
+
+        yield from ast
+
+
+def parse_file(path):
+    """
+    Parses a source file one declaration at a time, reading it through a memory
+    map. Memory use is bounded by the largest declaration rather than the whole file.
+
+    Pipes and other streams can't be mapped, so they are read in full first.
+    """
+    with open(path, 'rb') as f:
+        info = os.fstat(f.fileno())
+        if not stat.S_ISREG(info.st_mode):
+            yield from _parse_declarations(f.read())
+            return
+
+        # Empty files can't be mapped either
+        if info.st_size == 0:
+            return
+
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as buf:
+            yield from _parse_declarations(buf)
@@ -0,0 +1,315 @@
+"""
+Table-driven peephole optimizer over the statements of each block.
+
+Each `Pattern` matches a short run of statements by instruction tag and
+returns what to replace them with. Patterns are looked up by the tag of the
+last statement in the window, so adding one is a matter of appending it to
+`PATTERNS` (or passing your own list to `optimize`).
+"""
+
+from collections import deque
+from dataclasses import dataclass
+from typing import Callable, Optional
+
+import cfg
+import qbe
+
+
+@dataclass
+class Context:
+    # Number of times each temporary is read in the function
+    uses: dict[str, int]
+
+    # Number of times each temporary is written in the function
+    defs: dict[str, int]
+
+    # Label of the block after the current one, if any
+    next_label: Optional[str]
+
+    # Whether the window ends at the last statement of the block
+    at_end: bool = False
+
+    def used_once(self, temp: qbe.Temporary) -> bool:
+        return self.uses.get(temp.value, 0) == 1 and self.defs.get(temp.value, 0) == 1
+
+
+@dataclass
+class Pattern:
+    # Name the hits are reported under
+    name: str
+
+    # Tags of the statements matched, in order. `None` matches any statement.
+    tags: tuple[Optional[qbe.InstrTag], ...]
+
+    # Returns the statements replacing the window, or None to leave it alone.
+    # Replacements must never add uses of a temporary, and only the use counts
+    # of temporaries written in the window may be looked at.
+    rewrite: Callable[[Context, list[qbe.Statement]], Optional[list[qbe.Statement]]]
+
+
+def tag(statement: qbe.Statement) -> qbe.InstrTag:
+    return statement.instr.tag if isinstance(statement, qbe.Assign) else statement.tag
+
+
+def _instr(statement: qbe.Statement) -> qbe.Instruction:
+    return statement.instr if isinstance(statement, qbe.Assign) else statement
+
+
+def _replace(value, old: qbe.Temporary, new: qbe.Value):
+    match value:
+        case qbe.Temporary() if value == old:
+            return new
+        case list():
+            return [_replace(v, old, new) for v in value]
+        case tuple():
+            return tuple(_replace(v, old, new) for v in value)
+        case _:
+            return value
+
+
+def _copy_forward(ctx: Context, window):
+    # %a =l copy %b; <use of %a>  ->  <use of %b>
+    copy, user = window
+    if not isinstance(copy, qbe.Assign):
+        return None
+
+    temp = copy.temp
+    if not ctx.used_once(temp) or temp not in cfg.uses(user):
+        return None
+
+    instr = _instr(user)
+    instr.args = _replace(instr.args, temp, copy.instr.args[0])
+    return [user]
+
+
+def _copy_into(ctx: Context, window):
+    # %a =l add ...; %b =l copy %a  ->  %b =l add ...
+    producer, copy = window
+    if not isinstance(producer, qbe.Assign) or not isinstance(copy, qbe.Assign):
+        return None
+    if copy.instr.args[0] != producer.temp or not ctx.used_once(producer.temp):
+        return None
+    if str(copy.ty) != str(producer.ty):
+        return None
+
+    return [qbe.Assign(copy.temp, copy.ty, producer.instr)]
+
+
+def _jmp_next(ctx: Context, window):
+    # jmp @next; @next  ->  @next
+    if not ctx.at_end or window[0].args[0] != ctx.next_label:
+        return None
+
+    return []
+
+
+def _dead_after_jump(ctx: Context, window):
+    # Nothing after a jump or return in the same block can run
+    return [window[0]]
+
+
+def _jnz_same(ctx: Context, window):
+    # jnz %c, @a, @a  ->  jmp @a
+    _, nonzero, otherwise = window[0].args
+    if nonzero != otherwise:
+        return None
+
+    return [qbe.Jmp(nonzero)]
+
+
+def _jnz_constant(ctx: Context, window):
+    # jnz 1, @a, @b  ->  jmp @a
+    value, nonzero, otherwise = window[0].args
+    if not isinstance(value, qbe.Constant):
+        return None
+
+    return [qbe.Jmp(nonzero if value.value != 0 else otherwise)]
+
+
+_COMPARISONS = {
+    qbe.Comparison.SLT: lambda a, b: a < b,
+    qbe.Comparison.SLE: lambda a, b: a <= b,
+    qbe.Comparison.SEQ: lambda a, b: a == b,
+    qbe.Comparison.SNE: lambda a, b: a != b,
+    qbe.Comparison.SGT: lambda a, b: a > b,
+    qbe.Comparison.SGE: lambda a, b: a >= b,
+}
+
+
+def _cmp_jnz(ctx: Context, window):
+    # %c =w ceqw 1, 1; jnz %c, @a, @b  ->  jmp @a
+    # %c =w cnew %x, 0; jnz %c, @a, @b  ->  jnz %x, @a, @b
+    cmp, jnz = window
+    if not isinstance(cmp, qbe.Assign):
+        return None
+    if jnz.args[0] != cmp.temp or not ctx.used_once(cmp.temp):
+        return None
+
+    ty, comparison, lhs, rhs = cmp.instr.args
+    if isinstance(lhs, qbe.Constant) and isinstance(rhs, qbe.Constant):
+        taken = _COMPARISONS[comparison](lhs.value, rhs.value)
+        return [qbe.Jmp(jnz.args[1] if taken else jnz.args[2])]
+
+    if ty.variant == "word" and comparison == qbe.Comparison.SNE and rhs == qbe.Constant(0):
+        return [qbe.Jnz(lhs, jnz.args[1], jnz.args[2])]
+
+    return None
+
+
+PATTERNS = [
+    Pattern("dead-after-ret", (qbe.InstrTag.RET, None), _dead_after_jump),
+    Pattern("dead-after-jmp", (qbe.InstrTag.JMP, None), _dead_after_jump),
+    Pattern("dead-after-jnz", (qbe.InstrTag.JNZ, None), _dead_after_jump),
+    Pattern("copy-forward", (qbe.InstrTag.COPY, None), _copy_forward),
+    Pattern("copy-into", (None, qbe.InstrTag.COPY), _copy_into),
+    Pattern("cmp-jnz", (qbe.InstrTag.CMP, qbe.InstrTag.JNZ), _cmp_jnz),
+    Pattern("jnz-same", (qbe.InstrTag.JNZ,), _jnz_same),
+    Pattern("jnz-constant", (qbe.InstrTag.JNZ,), _jnz_constant),
+    Pattern("jmp-next", (qbe.InstrTag.JMP,), _jmp_next),
+]
+
+
+def _index(patterns: list[Pattern]) -> dict[Optional[qbe.InstrTag], list[Pattern]]:
+    table = {}
+    for pattern in patterns:
+        table.setdefault(pattern.tags[-1], []).append(pattern)
+
+    return table
+
+
+def _tally(statements, uses: dict[str, int], defs: dict[str, int], delta: int = 1):
+    for statement in statements:
+        for temp in cfg.uses(statement):
+            uses[temp.value] = uses.get(temp.value, 0) + delta
+
+        temp = cfg.definition(statement)
+        if temp is not None:
+            defs[temp.value] = defs.get(temp.value, 0) + delta
+
+
+def _count(function: qbe.Function) -> tuple[dict[str, int], dict[str, int], dict[str, int]]:
+    """
+    Counts the reads and writes of each temporary, and finds the block each
+    one is written in
+    """
+    uses = {}
+    defs = {}
+    homes = {}
+    for _, temp in function.args:
+        defs[temp.value] = defs.get(temp.value, 0) + 1
+
+    for index, block in enumerate(function.body):
+        _tally(block.statements, uses, defs)
+        for statement in block.statements:
+            temp = cfg.definition(statement)
+            if temp is not None:
+                homes[temp.value] = index
+
+    return uses, defs, homes
+
+
+def _matches(pattern: Pattern, statements: list) -> bool:
+    # Windows always end at the last statement
+    start = len(statements) - len(pattern.tags)
+    if start < 0:
+        return False
+
+    return all(t is None or tag(statements[start + k]) == t for k, t in enumerate(pattern.tags))
+
+
+def _rewrite_block(block: qbe.Block, ctx: Context, table, hits: dict[str, int]) -> set[str]:
+    """
+    Runs the patterns over one block, returning the temporaries whose counts changed
+    """
+    wildcard = table.get(None, [])
+    changed = set()
+
+    # Reversed, so the next statement is popped off the end
+    pending = block.statements[::-1]
+    out = []
+
+    while len(pending) > 0:
+        out.append(pending.pop())
+        ctx.at_end = len(pending) == 0
+
+        for pattern in table.get(tag(out[-1]), []) + wildcard:
+            if not _matches(pattern, out):
+                continue
+
+            window = out[len(out) - len(pattern.tags):]
+
+            # Rewrites may change the window's statements in place, so count them first
+            before_uses, before_defs = {}, {}
+            _tally(window, before_uses, before_defs)
+
+            replacement = pattern.rewrite(ctx, window)
+            if replacement is None:
+                continue
+
+            after_uses, after_defs = {}, {}
+            _tally(replacement, after_uses, after_defs)
+            for counts, before, after in [(ctx.uses, before_uses, after_uses), (ctx.defs, before_defs, after_defs)]:
+                for temp in before.keys() | after.keys():
+                    delta = after.get(temp, 0) - before.get(temp, 0)
+                    if delta != 0:
+                        counts[temp] = counts.get(temp, 0) + delta
+                        changed.add(temp)
+
+            del out[len(out) - len(pattern.tags):]
+            pending.extend(reversed(replacement))
+            hits[pattern.name] = hits.get(pattern.name, 0) + 1
+            break
+
+    block.statements = out
+
+    return changed
+
+
+def optimize(function: qbe.Function, patterns: list[Pattern] = PATTERNS) -> dict[str, int]:
+    """
+    Rewrites a function until no pattern matches, returning the number of
+    times each pattern fired.
+
+    Statements are moved one at a time from the block onto an output list,
+    and each move tries the windows that end at the statement just moved. A
+    rewrite takes its window off the output and puts the replacement back in
+    front of the remaining input, so the new statements take part in further
+    matches. Every rewrite shrinks the block or can't be undone by another, so
+    one run over a block takes time linear in its length.
+
+    Use counts are kept up to date as statements are rewritten. Patterns only
+    look at the counts of temporaries written in their window, so when a count
+    changes, the block writing that temporary is run again. Once no block is
+    left to run, no pattern matches anywhere in the function.
+    """
+    table = _index(patterns)
+    hits = {}
+    uses, defs, homes = _count(function)
+
+    labels = [block.label for block in function.body]
+    queue = deque(range(len(function.body)))
+    queued = set(queue)
+
+    while len(queue) > 0:
+        index = queue.popleft()
+        queued.discard(index)
+
+        next_label = labels[index + 1] if index + 1 < len(labels) else None
+        changed = _rewrite_block(function.body[index], Context(uses, defs, next_label), table, hits)
+
+        for temp in changed:
+            home = homes.get(temp)
+            if home is not None and home not in queued:
+                queue.append(home)
+                queued.add(home)
+
+    return hits
+
+
+def optimize_module(module: qbe.Module, patterns: list[Pattern] = PATTERNS) -> dict[str, int]:
+    hits = {}
+    for function in module.functions:
+        for name, count in optimize(function, patterns).items():
+            hits[name] = hits.get(name, 0) + count
+
+    return hits
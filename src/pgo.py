@@ -0,0 +1,319 @@
+"""
+Profile-guided optimization.
+
+`instrument` adds a counter to every block, and a routine that writes the
+counts to `nighthawk.prof` when the program exits. Each line of the profile
+is `<function> <block label> <count>`. `apply_profile` reads those counts
+back in to lay out blocks and functions, and to inline small functions
+into hot blocks.
+
+Both have to run on the module straight out of the code generator, before
+any other pass, so the block labels in the profile line up.
+"""
+
+import heapq
+
+import cfg
+import qbe
+
+
+PROFILE_PATH = "nighthawk.prof"
+
+# Callees with at most this many statements get inlined into hot blocks
+INLINE_LIMIT = 32
+
+# Blocks run at least this fraction as often as the hottest block are hot
+HOT_FRACTION = 0.01
+
+
+def _counters(function: qbe.Function) -> str:
+    # Function names can't contain dots, so these never clash with them
+    return f"prof.count.{function.name}"
+
+
+def _after_allocs(block: qbe.Block) -> int:
+    # Stack allocations stay at the top of the entry block
+    start = 0
+    while start < len(block.statements) and cfg.is_alloc(block.statements[start]):
+        start += 1
+
+    return start
+
+
+def _string(module: qbe.Module, name: str, string: str) -> qbe.Global:
+    module.add_data(qbe.DataDef(
+        linkage=qbe.Linkage.private(),
+        name=name,
+        align=None,
+        items=[(qbe.Byte, qbe.String(string)), (qbe.Byte, qbe.Constant(0))]
+    ))
+
+    return qbe.Global(name)
+
+
+def instrument(module: qbe.Module):
+    """
+    Adds per-block execution counters to every function in the module, and
+    registers a routine with `atexit` in `main` to write them out
+    """
+    functions = list(module.functions)
+    header = qbe.Block(label="start", statements=[])
+    dump = qbe.Block(label="write", statements=[])
+    done = qbe.Block(label="done", statements=[qbe.Ret()])
+    file = qbe.Temporary("prof.file")
+    ok = qbe.Temporary("prof.ok")
+    fmt = _string(module, "prof.fmt", "%s %ld\\n")
+
+    # Skip writing the profile if it can't be opened
+    header.add_instruction(qbe.Assign(file, qbe.Long, qbe.Call("fopen", [
+        (qbe.Long, _string(module, "prof.path", PROFILE_PATH)),
+        (qbe.Long, _string(module, "prof.mode", "w")),
+    ])))
+    header.add_instruction(qbe.Assign(ok, qbe.Word, qbe.Cmp(qbe.Long, qbe.Comparison.SNE, file, qbe.Constant(0))))
+    header.add_instruction(qbe.Jnz(ok, dump.label, done.label))
+
+    for function in functions:
+        counters = _counters(function)
+        module.add_data(qbe.DataDef(
+            linkage=qbe.Linkage.private(),
+            name=counters,
+            align=8,
+            items=[(qbe.Long, qbe.Constant(0)) for _ in function.body]
+        ))
+
+        for i, block in enumerate(function.body):
+            start = _after_allocs(block)
+            addr = qbe.Temporary(f"prof.{i}.addr")
+            count = qbe.Temporary(f"prof.{i}.count")
+            block.statements[start:start] = [
+                qbe.Assign(addr, qbe.Long, qbe.Add(qbe.Global(counters), qbe.Constant(8 * i))),
+                qbe.Assign(count, qbe.Long, qbe.Load(qbe.Long, addr)),
+                qbe.Assign(count, qbe.Long, qbe.Add(count, qbe.Constant(1))),
+                qbe.Store(qbe.Long, count, addr),
+            ]
+
+            # Write out "<function> <label>" and the count
+            name = _string(module, f"prof.name.{function.name}.{i}", f"{function.name} {block.label}")
+            source = qbe.Temporary(f"{counters}.{i}.addr")
+            value = qbe.Temporary(f"{counters}.{i}")
+            dump.add_instruction(qbe.Assign(source, qbe.Long, qbe.Add(qbe.Global(counters), qbe.Constant(8 * i))))
+            dump.add_instruction(qbe.Assign(value, qbe.Long, qbe.Load(qbe.Long, source)))
+            dump.add_instruction(qbe.Call("fprintf", [(qbe.Long, file), (qbe.Long, fmt), (qbe.Long, name), (qbe.Long, value)], variadic_from=2))
+
+    dump.add_instruction(qbe.Call("fclose", [(qbe.Long, file)]))
+
+    module.add_function(qbe.Function(
+        linkage=qbe.Linkage.private(),
+        name="prof.dump",
+        args=[],
+        return_type=None,
+        body=[header, dump, done]
+    ))
+
+    for function in functions:
+        if function.name == "main" and len(function.body) > 0:
+            entry = function.body[0]
+            entry.statements.insert(_after_allocs(entry), qbe.Call("atexit", [(qbe.Long, qbe.Global("prof.dump"))]))
+
+
+def read_profile(path: str) -> dict[tuple[str, str], int]:
+    """
+    Reads the counts written by an instrumented program, keyed by function name and block label
+    """
+    counts = {}
+    with open(path) as f:
+        for line in f:
+            parts = line.split()
+            if len(parts) != 3:
+                continue
+
+            function, label, count = parts
+            counts[(function, label)] = counts.get((function, label), 0) + int(count)
+
+    return counts
+
+
+def _make_fallthrough_explicit(function: qbe.Function):
+    for i, block in enumerate(function.body[:-1]):
+        if len(block.statements) == 0 or not cfg.is_terminator(block.statements[-1]):
+            block.add_instruction(qbe.Jmp(function.body[i + 1].label))
+
+
+def reorder_blocks(function: qbe.Function, counts: dict[tuple[str, str], int]):
+    """
+    Lays blocks out so each one is followed by its hottest successor, and
+    moves blocks that never ran to the end of the function
+    """
+    if len(function.body) < 3:
+        return
+
+    _make_fallthrough_explicit(function)
+
+    count = lambda label: counts.get((function.name, label), 0)
+    succs = cfg.successors(function)
+    blocks = {block.label: block for block in function.body}
+
+    # Blocks not placed yet, and a heap of them by count and then original
+    # position, for when a chain has no hot successor left to follow
+    position = {block.label: i for i, block in enumerate(function.body)}
+    remaining = set(position)
+    leftover = [(-count(label), i, label) for label, i in position.items()]
+    heapq.heapify(leftover)
+
+    placed = []
+    label = function.body[0].label
+    while True:
+        placed.append(label)
+        remaining.discard(label)
+        if len(remaining) == 0:
+            break
+
+        # Keep following the hottest successor, or start a new chain from the
+        # hottest block left over
+        candidates = [s for s in succs[label] if s in remaining and count(s) > 0]
+        if len(candidates) > 0:
+            label = max(candidates, key=lambda l: (count(l), -position[l]))
+        else:
+            while leftover[0][2] not in remaining:
+                heapq.heappop(leftover)
+            label = leftover[0][2]
+
+    cold = {label for label in placed[1:] if count(label) == 0}
+    hot = [label for label in placed if label not in cold]
+    cold = [label for label in placed if label in cold]
+    function.body = [blocks[label] for label in hot + cold]
+
+
+def _inline(caller: qbe.Function, index: int, position: int, callee: qbe.Function, serial: int) -> list[str]:
+    """
+    Replaces the call at `position` in the caller's block with a copy of the
+    callee's body, returning the labels of the new blocks
+    """
+    block = caller.body[index]
+    statement = block.statements[position]
+    call = statement.instr if isinstance(statement, qbe.Assign) else statement
+    prefix = f"inl.{serial}"
+
+    rename = lambda temp: qbe.Temporary(f"{prefix}.{temp.value}")
+    relabel = lambda label: f"{prefix}.{label}"
+
+    def copy_value(value):
+        match value:
+            case qbe.Temporary():
+                return rename(value)
+            case list():
+                return [copy_value(v) for v in value]
+            case tuple():
+                return tuple(copy_value(v) for v in value)
+            case _:
+                return value
+
+    def copy_instr(instr: qbe.Instruction) -> qbe.Instruction:
+        new = qbe.Instruction.__new__(type(instr))
+        new.tag = instr.tag
+        new.args = copy_value(instr.args)
+        if instr.tag == qbe.InstrTag.JMP:
+            new.args = (relabel(instr.args[0]),)
+        elif instr.tag == qbe.InstrTag.JNZ:
+            new.args = (new.args[0], relabel(instr.args[1]), relabel(instr.args[2]))
+        return new
+
+    cont = qbe.Block(label=f"{prefix}.cont", statements=block.statements[position + 1:])
+    block.statements = block.statements[:position]
+
+    for (ty, param), (_, arg) in zip(callee.args, call.args[1]):
+        block.add_instruction(qbe.Assign(rename(param), ty, qbe.Copy(arg)))
+    block.add_instruction(qbe.Jmp(relabel(callee.body[0].label)))
+
+    body = []
+    for callee_block in callee.body:
+        statements = []
+        for s in callee_block.statements:
+            if isinstance(s, qbe.Ret):
+                if isinstance(statement, qbe.Assign) and s.args[0] is not None:
+                    statements.append(qbe.Assign(statement.temp, statement.ty, qbe.Copy(copy_value(s.args[0]))))
+                statements.append(qbe.Jmp(cont.label))
+            elif isinstance(s, qbe.Assign):
+                statements.append(qbe.Assign(rename(s.temp), s.ty, copy_instr(s.instr)))
+            else:
+                statements.append(copy_instr(s))
+        body.append(qbe.Block(label=relabel(callee_block.label), statements=statements))
+
+    caller.body[index + 1:index + 1] = body + [cont]
+
+    return [b.label for b in body] + [cont.label]
+
+
+def _inlinable(callee: qbe.Function) -> bool:
+    statements = [s for block in callee.body for s in block.statements]
+    if len(callee.body) == 0 or len(statements) > INLINE_LIMIT:
+        return False
+
+    # Allocations would stop being part of the fixed frame, and recursion never ends
+    return not any(
+        cfg.is_alloc(s) or (isinstance(s, qbe.Call) and s.args[0] == callee.name)
+        or (isinstance(s, qbe.Assign) and s.instr.tag == qbe.InstrTag.CALL and s.instr.args[0] == callee.name)
+        for s in statements
+    )
+
+
+def inline_hot_calls(module: qbe.Module, counts: dict[tuple[str, str], int]) -> int:
+    """
+    Inlines calls to small functions made from hot blocks, returning how many were inlined
+    """
+    functions = {function.name: function for function in module.functions}
+    hottest = max(counts.values(), default=0)
+    inlined = 0
+
+    for caller in module.functions:
+        # The functions each block's code was inlined through, so that
+        # mutually recursive functions aren't inlined into each other forever
+        chains = {}
+
+        index = 0
+        while index < len(caller.body):
+            block = caller.body[index]
+            hot = hottest > 0 and counts.get((caller.name, block.label), 0) >= hottest * HOT_FRACTION
+            chain = chains.get(block.label, (caller.name,))
+
+            for position, statement in enumerate(block.statements):
+                call = statement.instr if isinstance(statement, qbe.Assign) else statement
+                if not hot or call.tag != qbe.InstrTag.CALL:
+                    continue
+
+                callee = functions.get(call.args[0])
+                if callee is None or callee.name in chain or not _inlinable(callee):
+                    continue
+                if len(call.args[1]) != len(callee.args):
+                    continue
+
+                # The new blocks run as often as the block they came from, and
+                # the rest of the block carries on in the caller
+                *labels, cont = _inline(caller, index, position, callee, inlined)
+                for label in labels + [cont]:
+                    counts[(caller.name, label)] = counts.get((caller.name, block.label), 0)
+                for label in labels:
+                    chains[label] = chain + (callee.name,)
+                chains[cont] = chain
+                inlined += 1
+                break
+
+            index += 1
+
+    return inlined
+
+
+def apply_profile(module: qbe.Module, counts: dict[tuple[str, str], int]):
+    """
+    Uses profile counts to inline small functions into hot blocks, lay out
+    each function's blocks along its hot path with cold blocks at the end,
+    and put hot functions before cold ones
+    """
+    counts = dict(counts)
+    inline_hot_calls(module, counts)
+
+    for function in module.functions:
+        reorder_blocks(function, counts)
+
+    entry = lambda function: counts.get((function.name, function.body[0].label), 0) if len(function.body) > 0 else 0
+    module.functions.sort(key=entry, reverse=True)
@@ -181,8 +181,8 @@ class Rem(Instruction[T]):
 class Comparison(Enum):
     SLT = "slt"
     SLE = "sle"
-    SEQ = "seq"
-    SNE = "sne"
+    SEQ = "eq"
+    SNE = "ne"
     SGT = "sgt"
     SGE = "sge"
 
@@ -197,9 +197,9 @@ class Cmp(Instruction[T]):
 
     def __str__(self) -> str:
         # Can't compare aggregate types
-        assert not isinstance(self.args[0], Type.AggregateType)
+        assert self.args[0].variant != "aggregate"
 
-        return f"c{self.args[1]}{self.args[0]} {self.args[2]} {self.args[3]}"
+        return f"c{self.args[1].value}{self.args[0]} {self.args[2]}, {self.args[3]}"
 
 
 class And(Instruction[T]):
@@ -279,15 +279,19 @@ class Call(Instruction[T]):
     Calls a function
     """
 
-    def __init__(self, function: str, args: list[(Type, Value)]):
-        super().__init__(InstrTag.CALL, function, args)
+    def __init__(self, function: str, args: list[(Type, Value)], variadic_from: Optional[int] = None):
+        # For variadic functions, the index of the first variable argument
+        super().__init__(InstrTag.CALL, function, args, variadic_from)
 
     def __str__(self) -> str:
-        args = ", ".join([f"{ty} {val}" for ty, val in self.args[1]])
-        return f"call ${self.args[0]}({args})"
+        args = [f"{ty} {val}" for ty, val in self.args[1]]
+        if self.args[2] is not None:
+            args.insert(self.args[2], "...")
+
+        return f"call ${self.args[0]}({', '.join(args)})"
     
     def __repr__(self) -> str:
-        return f"Call(function={self.args[0]}, args={self.args[1]})"
+        return f"Call(function={self.args[0]}, args={self.args[1]}, variadic_from={self.args[2]})"
     
 class Alloc4(Instruction[T]):
     """
@@ -354,6 +358,24 @@ class Blit(Instruction[T]):
     def __str__(self) -> str:
         return f"blit {self.args[0]}, {self.args[1]}, {self.args[2]}"
 
+@dataclass
+class Assign(Statement):
+    """
+    Assigns the result of an instruction to a temporary
+    """
+
+    # Destination temporary
+    temp: Temporary
+
+    # Type of the result
+    ty: Type
+
+    # Instruction producing the value
+    instr: Instruction
+
+    def __str__(self) -> str:
+        return f"{self.temp} ={self.ty} {self.instr}"
+
 @dataclass
 class Temporary(Value):
     value: str
@@ -471,7 +493,7 @@ class Function:
         if self.return_type is not None:
             out += f" {self.return_type}"
 
-        out += " ${}({})".format(str(self.name), "\n".join([ f"{ty} {temp}" for (ty, temp) in self.args ]))
+        out += " ${}({})".format(str(self.name), ", ".join([ f"{ty} {temp}" for (ty, temp) in self.args ]))
 
         out += " {\n"
 
@@ -0,0 +1,362 @@
+"""
+Compact binary format for ASTs and QBE modules.
+
+A file is the magic bytes, a version number, a string table and then a single
+encoded value. Every value starts with a varint tag: small tags are builtin
+types, then come the `_QBE_NODES` and then the `_AST_NODES`, each in a range
+of their own. Strings are stored once in the table and referred to by index.
+Integers are zigzag varints.
+
+New node types must only ever be appended to `_QBE_NODES`, `_AST_NODES` and
+`_ENUMS`, and the version bumped if an existing layout changes.
+"""
+
+import dataclasses
+import mmap
+import os
+import struct
+
+import qbe
+
+MAGIC = b"NHWK"
+VERSION = 3
+
+_TRUNCATED = "Truncated or corrupt nighthawk serialized file"
+
+_NONE = 0
+_FALSE = 1
+_TRUE = 2
+_INT = 3
+_FLOAT = 4
+_STR = 5
+_LIST = 6
+_TUPLE = 7
+_ENUM = 8
+
+# Each kind of node has its own range of tags, so appending to one list never
+# renumbers the other. Both fit in a single byte.
+_NODE = 16
+_QBE_NODE = _NODE
+_AST_NODE = 80
+_END = 128
+
+_DOUBLE = struct.Struct("<d")
+
+_ENUMS = [qbe.InstrTag, qbe.Comparison]
+
+# The AST is only imported when one is read or written, so loading a QBE
+# module doesn't pay for it
+_AST_NODES = [
+    "Name",
+    "FunctionDeclaration",
+    "ConstantDeclaration",
+    "PrintStatement",
+    "Add",
+    "Sub",
+    "Mul",
+    "Div",
+    "And",
+    "Or",
+    "Equal",
+    "NotEqual",
+    "LessThan",
+    "GreaterThan",
+    "LessThanEqual",
+    "GreaterThanEqual",
+    "Neg",
+    "Boolean",
+]
+
+_QBE_NODES = [
+    qbe.Module,
+    qbe.Function,
+    qbe.Block,
+    qbe.DataDef,
+    qbe.TypeDef,
+    qbe.Linkage,
+    qbe.Type,
+    qbe.Temporary,
+    qbe.Global,
+    qbe.Constant,
+    qbe.Symbol,
+    qbe.String,
+    qbe.Assign,
+    qbe.Add,
+    qbe.Sub,
+    qbe.Mul,
+    qbe.Div,
+    qbe.Rem,
+    qbe.Cmp,
+    qbe.And,
+    qbe.Or,
+    qbe.Copy,
+    qbe.Ret,
+    qbe.Jnz,
+    qbe.Jmp,
+    qbe.Call,
+    qbe.Alloc4,
+    qbe.Alloc8,
+    qbe.Alloc16,
+    qbe.Store,
+    qbe.Load,
+    qbe.Blit,
+]
+
+# Builtin types are shared instances, so they are stored by variant alone
+_BUILTIN_TYPES = {
+    ty.variant: ty
+    for ty in [qbe.Word, qbe.Long, qbe.Single, qbe.Double, qbe.Byte, qbe.Halfword, qbe.AggregateType]
+}
+
+
+def _fields(cls) -> tuple[str, ...]:
+    if issubclass(cls, qbe.Instruction):
+        return ("tag", "args")
+    if not dataclasses.is_dataclass(cls):
+        return tuple(cls.__annotations__)
+
+    return tuple(f.name for f in dataclasses.fields(cls))
+
+
+assert _QBE_NODE + len(_QBE_NODES) <= _AST_NODE and _AST_NODE + len(_AST_NODES) <= _END
+
+# Indexed by tag, with gaps left for nodes to be appended
+_NODE_FIELDS = [None] * (_END - _NODE)
+_NODE_TAGS = {}
+for i, cls in enumerate(_QBE_NODES):
+    _NODE_FIELDS[_QBE_NODE - _NODE + i] = (cls, _fields(cls))
+    _NODE_TAGS[cls] = (_QBE_NODE + i, _fields(cls))
+
+
+def _load_ast():
+    if _NODE_FIELDS[_AST_NODE - _NODE] is not None:
+        return
+
+    import tree
+
+    for i, name in enumerate(_AST_NODES):
+        cls = getattr(tree, name)
+        _NODE_FIELDS[_AST_NODE - _NODE + i] = (cls, _fields(cls))
+        _NODE_TAGS[cls] = (_AST_NODE + i, _fields(cls))
+
+
+_ENUM_TAGS = {enum: i for i, enum in enumerate(_ENUMS)}
+_ENUM_MEMBERS = [list(enum) for enum in _ENUMS]
+
+
+class _Writer:
+    def __init__(self):
+        self.out = bytearray()
+        self.strings = {}
+
+    def varint(self, n: int):
+        out = self.out
+        while n >= 0x80:
+            out.append((n & 0x7f) | 0x80)
+            n >>= 7
+        out.append(n)
+
+    def string(self, s: str):
+        index = self.strings.get(s)
+        if index is None:
+            index = self.strings[s] = len(self.strings)
+        self.varint(index)
+
+    def value(self, value):
+        cls = type(value)
+
+        if value is None:
+            self.out.append(_NONE)
+        elif cls is bool:
+            self.out.append(_TRUE if value else _FALSE)
+        elif cls is int:
+            self.out.append(_INT)
+            self.varint(value << 1 if value >= 0 else ((-value) << 1) - 1)
+        elif cls is float:
+            self.out.append(_FLOAT)
+            self.out += _DOUBLE.pack(value)
+        elif isinstance(value, str):
+            self.out.append(_STR)
+            self.string(str(value))
+        elif cls is list or cls is tuple:
+            self.out.append(_LIST if cls is list else _TUPLE)
+            self.varint(len(value))
+            for item in value:
+                self.value(item)
+        elif cls in _ENUM_TAGS:
+            self.out.append(_ENUM)
+            self.varint(_ENUM_TAGS[cls])
+            self.varint(_ENUM_MEMBERS[_ENUM_TAGS[cls]].index(value))
+        elif cls in _NODE_TAGS:
+            tag, fields = _NODE_TAGS[cls]
+            self.varint(tag)
+
+            if cls is qbe.Type and _BUILTIN_TYPES.get(value.variant) is value:
+                self.value(value.variant)
+                self.value(None)
+                return
+
+            for name in fields:
+                self.value(getattr(value, name))
+        elif cls.__module__ == "tree" and _NODE_FIELDS[_AST_NODE - _NODE] is None:
+            _load_ast()
+            self.value(value)
+        else:
+            raise RuntimeError(f"Cannot serialize value {value!r}")
+
+    def finish(self) -> bytes:
+        body = self.out
+
+        self.out = bytearray(MAGIC)
+        self.varint(VERSION)
+        self.varint(len(self.strings))
+        for s in self.strings:
+            data = s.encode("utf-8")
+            self.varint(len(data))
+            self.out += data
+
+        return bytes(self.out + body)
+
+
+class _Reader:
+    def __init__(self, buf: memoryview):
+        self.buf = buf
+        self.pos = 0
+
+        if bytes(self.buf[:len(MAGIC)]) != MAGIC:
+            raise RuntimeError("Not a nighthawk serialized file")
+        self.pos = len(MAGIC)
+
+        version = self.varint()
+        if version != VERSION:
+            raise RuntimeError(f"Unsupported serialization version {version} (expected {VERSION})")
+
+        self.strings = []
+        for _ in range(self.varint()):
+            n = self.varint()
+            if self.pos + n > len(self.buf):
+                raise RuntimeError(_TRUNCATED)
+            self.strings.append(str(self.buf[self.pos:self.pos + n], "utf-8"))
+            self.pos += n
+
+    def varint(self) -> int:
+        buf = self.buf
+        pos = self.pos
+        result = 0
+        shift = 0
+        while True:
+            byte = buf[pos]
+            pos += 1
+            result |= (byte & 0x7f) << shift
+            if byte < 0x80:
+                break
+            shift += 7
+        self.pos = pos
+        return result
+
+    def value(self):
+        # Tags almost always fit in a single byte
+        tag = self.buf[self.pos]
+        if tag < 0x80:
+            self.pos += 1
+        else:
+            tag = self.varint()
+
+        if tag >= _NODE:
+            if tag >= _AST_NODE:
+                _load_ast()
+
+            entry = _NODE_FIELDS[tag - _NODE] if tag < _END else None
+            if entry is None:
+                raise RuntimeError(f"Unknown serialization tag {tag}")
+
+            cls, fields = entry
+            node = cls.__new__(cls)
+            node.__dict__.update({name: self.value() for name in fields})
+
+            if cls is qbe.Type and node.arg is None:
+                return _BUILTIN_TYPES.get(node.variant, node)
+
+            return node
+
+        if tag < len(_BUILTINS):
+            return _BUILTINS[tag](self)
+
+        raise RuntimeError(f"Unknown serialization tag {tag}")
+
+    def read_int(self) -> int:
+        z = self.varint()
+        return z >> 1 if z & 1 == 0 else -((z + 1) >> 1)
+
+    def read_float(self) -> float:
+        value = _DOUBLE.unpack_from(self.buf, self.pos)[0]
+        self.pos += _DOUBLE.size
+        return value
+
+    def read_string(self) -> str:
+        return self.strings[self.varint()]
+
+    def read_list(self) -> list:
+        return [self.value() for _ in range(self.varint())]
+
+    def read_tuple(self) -> tuple:
+        return tuple(self.value() for _ in range(self.varint()))
+
+    def read_enum(self):
+        members = _ENUM_MEMBERS[self.varint()]
+        return members[self.varint()]
+
+
+# Indexed by tag
+_BUILTINS = [
+    lambda r: None,
+    lambda r: False,
+    lambda r: True,
+    _Reader.read_int,
+    _Reader.read_float,
+    _Reader.read_string,
+    _Reader.read_list,
+    _Reader.read_tuple,
+    _Reader.read_enum,
+]
+
+
+def dumps(value) -> bytes:
+    """
+    Serializes an AST (or list of declarations) or any QBE object
+    """
+    writer = _Writer()
+    writer.value(value)
+    return writer.finish()
+
+
+def loads(data):
+    """
+    Deserializes a value from any bytes-like object
+    """
+    buf = memoryview(data)
+    try:
+        return _Reader(buf).value()
+    except (IndexError, struct.error):
+        # Reads aren't bounds checked one by one, running off the end shows up here
+        raise RuntimeError(_TRUNCATED) from None
+    finally:
+        buf.release()
+
+
+def dump(value, path: str):
+    with open(path, "wb") as f:
+        f.write(dumps(value))
+
+
+def load(path: str):
+    """
+    Deserializes a value from a file, reading it through a memory map
+    """
+    with open(path, "rb") as f:
+        # Empty files can't be mapped
+        if os.fstat(f.fileno()).st_size == 0:
+            raise RuntimeError("Not a nighthawk serialized file (it is empty)")
+
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as m:
+            return loads(m)
@@ -0,0 +1,217 @@
+from dataclasses import dataclass, field
+
+import cfg
+import qbe
+
+
+ALIGNMENT = {
+    qbe.InstrTag.ALLOC4: 4,
+    qbe.InstrTag.ALLOC8: 8,
+    qbe.InstrTag.ALLOC16: 16,
+}
+
+ALLOCS = {
+    4: qbe.Alloc4,
+    8: qbe.Alloc8,
+    16: qbe.Alloc16,
+}
+
+
+@dataclass(eq=False)
+class _Slot:
+    statement: qbe.Assign
+    align: int
+    size: int
+
+    # First and last position the slot is accessed at, in layout order
+    start: int = -1
+    end: int = -1
+
+
+@dataclass(eq=False)
+class _Color:
+    align: int
+    size: int
+    slots: list[_Slot] = field(default_factory=list)
+
+
+def _frame_size(sizes: list[tuple[int, int]]) -> int:
+    # Each area is padded out to its alignment
+    return sum(-(-size // align) * align for align, size in sizes)
+
+
+def _operands(statement: qbe.Statement) -> tuple[list, list]:
+    """
+    Splits a statement's temporaries into those used as an address to read or
+    write through, and everything else
+    """
+    instr = statement.instr if isinstance(statement, qbe.Assign) else statement
+    match instr.tag:
+        case qbe.InstrTag.LOAD:
+            addresses, others = [instr.args[1]], []
+        case qbe.InstrTag.STORE:
+            addresses, others = [instr.args[2]], [instr.args[1]]
+        case qbe.InstrTag.BLIT:
+            addresses, others = [instr.args[0], instr.args[1]], []
+        case _:
+            return [], cfg.uses(statement)
+
+    return (
+        [a for a in addresses if isinstance(a, qbe.Temporary)],
+        [o for o in others if isinstance(o, qbe.Temporary)],
+    )
+
+
+def _is_reducible(function: qbe.Function, positions: dict[str, int]) -> bool:
+    """
+    Checks every backwards jump in the layout goes to a block dominating it,
+    which makes layout order a safe basis for live ranges
+    """
+    succs = cfg.successors(function)
+    doms = cfg.dominators(function, succs)
+
+    for label, targets in succs.items():
+        for target in targets:
+            if positions[target] <= positions[label] and label in doms and target not in doms[label]:
+                return False
+
+    return True
+
+
+def color_slots(function: qbe.Function) -> int:
+    """
+    Shares stack areas between allocations whose live ranges don't overlap,
+    returning the number of frame bytes saved.
+
+    Only fixed-size allocations in the entry block whose addresses are used
+    purely by loads, stores and blits are considered; anything else might let
+    the address escape. A live range runs from the first access to the last
+    one in layout order, widened to cover any loop it touches. An area can
+    hold allocations of its own alignment or smaller.
+    """
+    if len(function.body) == 0:
+        return 0
+
+    slots = {}
+    for statement in function.body[0].statements:
+        if not cfg.is_alloc(statement) or not isinstance(statement.instr.args[0], int):
+            continue
+        slots[statement.temp.value] = _Slot(statement, ALIGNMENT[statement.instr.tag], statement.instr.args[0])
+
+    if len(slots) < 2:
+        return 0
+
+    # Number statements in layout order, and find where each slot is live
+    position = 0
+    block_range = {}
+    escaped = set()
+    defs = {}
+    for block in function.body:
+        first = position
+        for statement in block.statements:
+            temp = cfg.definition(statement)
+            if temp is not None:
+                defs[temp.value] = defs.get(temp.value, 0) + 1
+
+            addresses, others = _operands(statement)
+            for temp in addresses:
+                if temp.value in slots:
+                    slot = slots[temp.value]
+                    slot.start = position if slot.start < 0 else slot.start
+                    slot.end = position
+            for temp in others:
+                escaped.add(temp.value)
+
+            position += 1
+        block_range[block.label] = (first, max(first, position - 1))
+
+    if not _is_reducible(function, {label: start for label, (start, _) in block_range.items()}):
+        return 0
+
+    candidates = [
+        slot for name, slot in slots.items()
+        if name not in escaped and defs[name] == 1 and slot.start >= 0
+    ]
+
+    # A slot live anywhere in a loop is live for the whole loop
+    loops = [
+        (min(block_range[b][0] for b in loop.blocks), max(block_range[b][1] for b in loop.blocks))
+        for loop in cfg.natural_loops(function)
+    ]
+    for slot in candidates:
+        changed = True
+        while changed:
+            changed = False
+            for start, end in loops:
+                overlaps = slot.start <= end and start <= slot.end
+                if overlaps and (start < slot.start or end > slot.end):
+                    slot.start = min(slot.start, start)
+                    slot.end = max(slot.end, end)
+                    changed = True
+
+    # Linear scan, handing out areas as soon as their last user is done
+    colors = []
+    active = []
+    free = []
+    for slot in sorted(candidates, key=lambda s: s.start):
+        for color, end in list(active):
+            if end < slot.start:
+                active.remove((color, end))
+                free.append(color)
+
+        fits = [c for c in free if c.align >= slot.align]
+        if len(fits) > 0:
+            # Prefer the closest alignment, then the area needing the least growth
+            color = min(fits, key=lambda c: (c.align, max(slot.size - c.size, 0)))
+            free.remove(color)
+            color.size = max(color.size, slot.size)
+        else:
+            color = _Color(slot.align, slot.size)
+            colors.append(color)
+
+        color.slots.append(slot)
+        active.append((color, slot.end))
+
+    before = _frame_size([(s.align, s.size) for s in candidates])
+    after = _frame_size([(c.align, c.size) for c in colors])
+    if after >= before:
+        return 0
+
+    # Keep the first allocation of each area, and point the others at it
+    renames = {}
+    removed = set()
+    for color in colors:
+        kept = color.slots[0].statement
+        kept.instr = ALLOCS[color.align](color.size)
+        for slot in color.slots[1:]:
+            renames[slot.statement.temp.value] = kept.temp
+            removed.add(id(slot.statement))
+
+    entry = function.body[0]
+    entry.statements = [s for s in entry.statements if id(s) not in removed]
+
+    for block in function.body:
+        for statement in block.statements:
+            instr = statement.instr if isinstance(statement, qbe.Assign) else statement
+            instr.args = _rename(instr.args, renames)
+
+    return before - after
+
+
+def _rename(value, renames: dict[str, qbe.Temporary]):
+    match value:
+        case qbe.Temporary(name) if name in renames:
+            return renames[name]
+        case list():
+            return [_rename(v, renames) for v in value]
+        case tuple():
+            return tuple(_rename(v, renames) for v in value)
+        case _:
+            return value
+
+
+def color_module_slots(module: qbe.Module) -> dict[str, int]:
+    """
+    Colors stack slots in every function, returning the frame bytes saved per function
+    """
+    return {function.name: color_slots(function) for function in module.functions}
@@ -0,0 +1,94 @@
+from typing import Optional
+
+import cfg
+import qbe
+
+
+def _tail_call(function: qbe.Function, block: qbe.Block) -> Optional[qbe.Call]:
+    """
+    Returns the self-call at the end of a block if it is in tail position
+    """
+    if len(block.statements) < 2:
+        return None
+
+    call, ret = block.statements[-2], block.statements[-1]
+
+    if not isinstance(ret, qbe.Ret):
+        return None
+
+    match call:
+        # `%r =l call $f(...)` followed by `ret %r`
+        case qbe.Assign(temp=temp, instr=qbe.Call() as instr) if ret.args[0] == temp:
+            pass
+        # `call $f(...)` followed by a plain `ret`
+        case qbe.Call() as instr if ret.args[0] is None and function.return_type is None:
+            pass
+        case _:
+            return None
+
+    if instr.args[0] != function.name or len(instr.args[1]) != len(function.args):
+        return None
+
+    return instr
+
+
+def eliminate_tail_calls(function: qbe.Function) -> int:
+    """
+    Rewrites self-recursive tail calls into jumps back to the start of the function.
+
+    Arguments are reassigned through fresh temporaries before the jump, so that
+    an argument may safely refer to any parameter. Parameters passed through
+    unchanged are left alone. Returns the number of calls rewritten.
+
+    Functions with stack allocations are left alone. Each call gets its own
+    frame, so a callee may be handed the address of its caller's slot, while
+    the loop would keep reusing the same one.
+    """
+    if len(function.body) == 0:
+        return 0
+
+    if any(cfg.is_alloc(s) for block in function.body for s in block.statements):
+        return 0
+
+    header = function.body[0]
+    rewritten = 0
+
+    for block in function.body:
+        call = _tail_call(function, block)
+        if call is None:
+            continue
+
+        # Drop the call and the return
+        del block.statements[-2:]
+
+        # Parameters passed straight through keep their value, and don't
+        # become definitions inside the loop
+        changed = [
+            (i, value) for i, (_, value) in enumerate(call.args[1])
+            if value != function.args[i][1]
+        ]
+
+        for i, value in changed:
+            block.add_instruction(qbe.Assign(qbe.Temporary(f"tce.{i}"), function.args[i][0], qbe.Copy(value)))
+
+        for i, _ in changed:
+            ty, param = function.args[i]
+            block.add_instruction(qbe.Assign(param, ty, qbe.Copy(qbe.Temporary(f"tce.{i}"))))
+
+        block.add_instruction(qbe.Jmp(header.label))
+        rewritten += 1
+
+    if rewritten > 0:
+        # The loop header can't be the entry block, so give the function a new one
+        entry = qbe.Block(label=f"{header.label}.tce", statements=[])
+        entry.add_instruction(qbe.Jmp(header.label))
+        function.body.insert(0, entry)
+
+    return rewritten
+
+
+def eliminate_module_tail_calls(module: qbe.Module) -> int:
+    """
+    Runs tail-call elimination over every function in a module
+    """
+    return sum(eliminate_tail_calls(function) for function in module.functions)
@@ -1,11 +1,11 @@
-from typing import List, Optional
+from typing import TYPE_CHECKING, List, Optional
 from dataclasses import dataclass, field
 
-from lark import Lark, Token, ast_utils, Transformer, v_args
-from lark.tree import Meta
+if TYPE_CHECKING:
+    from lark import Token
 
 
-class _Ast(ast_utils.Ast):
+class _Ast:
     # This will be skipped by create_transformer(), because it starts with an underscore
     pass
 
@@ -56,34 +56,6 @@ class PrintStatement(_Statement):
     string: str
 
 
-class ToAst(Transformer):
-    # Define extra transformation functions, for rules that don't correspond to an AST class.
-
-    def STRING(self, s):
-        # Remove quotation marks
-        return s[1:-1]
-
-    def number(self, tok):
-        n = tok[0]
-        match n.type:
-            case "python__DEC_NUMBER":
-                return int(n)
-            case "python__HEX_NUMBER":
-                return int(n, 16)
-            case "python__OCT_NUMBER":
-                return int(n, 8)
-            case "python__BIN_NUMBER":
-                return int(n, 2)
-            case "python__FLOAT_NUMBER":
-                return float(n)
-            
-    def NAME(self, n):
-        return Name(n.value)
-
-    @v_args(inline=True)
-    def start(self, x):
-        return x
-
 @dataclass
 class Add(Expression):
     lhs: Expression
@@ -152,7 +124,7 @@ class Neg(Expression):
 class Boolean(Expression):
     value: bool
 
-    def __init__(self, value: Token):
+    def __init__(self, value: "Token"):
         self.value = value.value == 'true'
 
     def __repr__(self) -> str:
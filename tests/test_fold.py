@@ -0,0 +1,159 @@
+import fold
+import qbe
+
+
+x = qbe.Temporary("x")
+r = qbe.Temporary("r")
+
+
+def string(name, text, linkage=None):
+    return qbe.DataDef(
+        linkage=linkage or qbe.Linkage.private(),
+        name=name,
+        align=None,
+        items=[(qbe.Byte, qbe.String(text)), (qbe.Byte, qbe.Constant(0))],
+    )
+
+
+def function(name, *statements, linkage=None):
+    return qbe.Function(
+        linkage=linkage or qbe.Linkage.private(),
+        name=name,
+        args=[(qbe.Long, x)],
+        return_type=qbe.Long,
+        body=[qbe.Block("start", list(statements))],
+    )
+
+
+def puts(name):
+    return qbe.Call("puts", [(qbe.Long, qbe.Global(name))])
+
+
+def module(data, functions):
+    module = qbe.Module()
+    for d in data:
+        module.add_data(d)
+    for f in functions:
+        module.add_function(f)
+    return module
+
+
+def test_identical_private_data_folded():
+    m = module(
+        [string("a", "hi"), string("b", "hi"), string("c", "bye")],
+        [function("main", puts("a"), puts("b"), puts("c"), qbe.Ret(x), linkage=qbe.Linkage.public())],
+    )
+
+    stats = fold.fold_module(m)
+
+    assert stats.data == 1
+    assert [d.name for d in m.data] == ["a", "c"]
+    assert [str(s) for s in m.functions[0].body[0].statements[:3]] == [
+        "call $puts(l $a)", "call $puts(l $a)", "call $puts(l $c)",
+    ]
+
+
+def test_data_pointed_at_not_folded():
+    table = qbe.DataDef(qbe.Linkage.private(), "table", None, [(qbe.Long, qbe.Symbol("b", None))])
+    m = module([string("a", "hi"), string("b", "hi"), table], [])
+
+    # Being pointed at counts as possibly written, so nothing is folded
+    assert fold.fold_module(m).data == 0
+    assert str(m.data[2].items[0][1]) == "$b"
+
+
+def test_stored_data_not_folded():
+    m = module(
+        [string("a", "hi"), string("b", "hi")],
+        [function(
+            "main",
+            puts("a"),
+            qbe.Store(qbe.Byte, qbe.Constant(72), qbe.Global("b")),
+            puts("b"),
+            qbe.Ret(x),
+            linkage=qbe.Linkage.public(),
+        )],
+    )
+
+    assert fold.fold_module(m).data == 0
+    assert [d.name for d in m.data] == ["a", "b"]
+
+
+def test_data_with_address_arithmetic_not_folded():
+    m = module(
+        [string("a", "hi"), string("b", "hi")],
+        [function(
+            "main",
+            puts("a"),
+            qbe.Assign(r, qbe.Long, qbe.Add(qbe.Global("b"), qbe.Constant(1))),
+            qbe.Ret(r),
+            linkage=qbe.Linkage.public(),
+        )],
+    )
+
+    assert fold.fold_module(m).data == 0
+
+
+def test_exported_definitions_kept():
+    body = lambda: [qbe.Assign(r, qbe.Long, qbe.Add(x, qbe.Constant(1))), qbe.Ret(r)]
+    m = module(
+        [string("a", "hi", qbe.Linkage.public()), string("b", "hi", qbe.Linkage.public())],
+        [
+            function("f", *body(), linkage=qbe.Linkage.public()),
+            function("g", *body()),
+            function("h", *body(), linkage=qbe.Linkage.public()),
+            function("i", *body()),
+        ],
+    )
+
+    stats = fold.fold_module(m)
+
+    # Only the private copies can go
+    assert stats.data == 0
+    assert stats.functions == 1
+    assert [f.name for f in m.functions] == ["f", "g", "h"]
+
+
+def test_self_recursive_functions_folded():
+    def countdown(name):
+        return qbe.Function(
+            linkage=qbe.Linkage.private(),
+            name=name,
+            args=[(qbe.Long, x)],
+            return_type=qbe.Long,
+            body=[
+                qbe.Block("start", [qbe.Jnz(x, "loop", "done")]),
+                qbe.Block("loop", [
+                    qbe.Assign(x, qbe.Long, qbe.Sub(x, qbe.Constant(1))),
+                    qbe.Assign(r, qbe.Long, qbe.Call(name, [(qbe.Long, x)])),
+                    qbe.Ret(r),
+                ]),
+                qbe.Block("done", [qbe.Ret(x)]),
+            ],
+        )
+
+    main = function(
+        "main",
+        qbe.Assign(r, qbe.Long, qbe.Call("f", [(qbe.Long, x)])),
+        qbe.Assign(r, qbe.Long, qbe.Call("g", [(qbe.Long, r)])),
+        qbe.Ret(r),
+        linkage=qbe.Linkage.public(),
+    )
+    m = module([], [countdown("f"), countdown("g"), main])
+
+    stats = fold.fold_module(m)
+
+    assert stats.functions == 1
+    assert [f.name for f in m.functions] == ["f", "main"]
+    assert str(m.functions[0].body[1].statements[1]) == "%r =l call $f(l %x)"
+    assert str(m.functions[1].body[0].statements[1]) == "%r =l call $f(l %r)"
+
+
+def test_mutually_recursive_functions_kept_apart():
+    # Each refers to the other by name, so their keys differ
+    def ping(name, other):
+        return function(name, qbe.Assign(r, qbe.Long, qbe.Call(other, [(qbe.Long, x)])), qbe.Ret(r))
+
+    m = module([], [ping("f", "g"), ping("g", "f")])
+
+    assert fold.fold_module(m).functions == 0
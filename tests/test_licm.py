@@ -0,0 +1,120 @@
+import licm
+import qbe
+
+
+i = qbe.Temporary("i")
+x = qbe.Temporary("x")
+t = qbe.Temporary("t")
+c = qbe.Temporary("c")
+v = qbe.Temporary("v")
+
+
+def function(*blocks):
+    return qbe.Function(
+        linkage=qbe.Linkage.private(),
+        name="f",
+        args=[(qbe.Word, x)],
+        return_type=qbe.Word,
+        body=[qbe.Block(label, list(statements)) for label, statements in blocks],
+    )
+
+
+def blocks(f):
+    return {block.label: [str(s) for s in block.statements] for block in f.body}
+
+
+def loop(*body):
+    """
+    `for i in 0..x` with the given statements at the top of the body
+    """
+    return function(
+        ("start", [qbe.Assign(i, qbe.Word, qbe.Copy(qbe.Constant(0)))]),
+        ("loop", [
+            *body,
+            qbe.Assign(i, qbe.Word, qbe.Add(i, qbe.Constant(1))),
+            qbe.Assign(c, qbe.Word, qbe.Cmp(qbe.Word, qbe.Comparison.SLT, i, x)),
+            qbe.Jnz(c, "loop", "done"),
+        ]),
+        ("done", [qbe.Ret(i)]),
+    )
+
+
+def test_pure_op_hoisted_into_preheader():
+    f = loop(qbe.Assign(t, qbe.Word, qbe.Mul(x, qbe.Constant(3))))
+
+    assert licm.hoist_invariants(f) == 1
+    assert [block.label for block in f.body] == ["start", "loop.pre", "loop", "done"]
+    assert blocks(f)["loop.pre"] == ["%t =w mul %x, 3", "jmp @loop"]
+    assert "%t =w mul %x, 3" not in blocks(f)["loop"]
+
+
+def test_op_using_the_loop_counter_stays():
+    f = loop(qbe.Assign(t, qbe.Word, qbe.Mul(i, qbe.Constant(3))))
+
+    assert licm.hoist_invariants(f) == 0
+
+
+def test_load_hoisted_when_nothing_writes():
+    f = loop(qbe.Assign(v, qbe.Word, qbe.Load(qbe.Word, qbe.Global("g"))))
+
+    assert licm.hoist_invariants(f) == 1
+    assert blocks(f)["loop.pre"] == ["%v =w loadw $g", "jmp @loop"]
+
+
+def test_load_stays_when_the_loop_stores():
+    f = loop(
+        qbe.Assign(v, qbe.Word, qbe.Load(qbe.Word, qbe.Global("g"))),
+        qbe.Store(qbe.Word, i, qbe.Global("h")),
+    )
+
+    assert licm.hoist_invariants(f) == 0
+
+
+def test_load_stays_when_the_loop_calls():
+    f = loop(
+        qbe.Assign(v, qbe.Word, qbe.Load(qbe.Word, qbe.Global("g"))),
+        qbe.Call("g", []),
+    )
+
+    assert licm.hoist_invariants(f) == 0
+
+
+def test_load_stays_in_a_block_not_run_every_iteration():
+    f = function(
+        ("start", [qbe.Assign(i, qbe.Word, qbe.Copy(qbe.Constant(0)))]),
+        ("loop", [
+            qbe.Assign(i, qbe.Word, qbe.Add(i, qbe.Constant(1))),
+            qbe.Assign(c, qbe.Word, qbe.Cmp(qbe.Word, qbe.Comparison.SLT, i, x)),
+            qbe.Jnz(c, "body", "done"),
+        ]),
+        ("body", [
+            qbe.Jnz(i, "skip", "read"),
+        ]),
+        ("read", [
+            qbe.Assign(v, qbe.Word, qbe.Load(qbe.Word, qbe.Global("g"))),
+        ]),
+        ("skip", [qbe.Jmp("loop")]),
+        ("done", [qbe.Ret(i)]),
+    )
+
+    assert licm.hoist_invariants(f) == 0
+    assert blocks(f)["read"] == ["%v =w loadw $g"]
+
+
+def test_fallthrough_latch_gets_a_jump():
+    # @latch falls through into the header, which would now be the preheader
+    f = function(
+        ("start", [qbe.Assign(i, qbe.Word, qbe.Copy(qbe.Constant(0))), qbe.Jmp("loop")]),
+        ("latch", [qbe.Assign(i, qbe.Word, qbe.Add(i, qbe.Constant(1)))]),
+        ("loop", [
+            qbe.Assign(t, qbe.Word, qbe.Mul(x, qbe.Constant(3))),
+            qbe.Assign(c, qbe.Word, qbe.Cmp(qbe.Word, qbe.Comparison.SLT, i, t)),
+            qbe.Jnz(c, "latch", "done"),
+        ]),
+        ("done", [qbe.Ret(i)]),
+    )
+
+    assert licm.hoist_invariants(f) == 1
+    assert [block.label for block in f.body] == ["start", "latch", "loop.pre", "loop", "done"]
+    assert blocks(f)["start"][-1] == "jmp @loop.pre"
+    assert blocks(f)["latch"][-1] == "jmp @loop"
@@ -0,0 +1,203 @@
+import time
+
+import peephole
+import qbe
+
+
+def function(*blocks, args=()):
+    return qbe.Function(
+        linkage=qbe.Linkage.private(),
+        name="f",
+        args=list(args),
+        return_type=qbe.Word,
+        body=[qbe.Block(label, list(statements)) for label, statements in blocks],
+    )
+
+
+def statements(f):
+    return [[str(s) for s in block.statements] for block in f.body]
+
+
+x = qbe.Temporary("x")
+y = qbe.Temporary("y")
+c = qbe.Temporary("c")
+
+
+def test_dead_after_ret():
+    f = function(("start", [qbe.Ret(qbe.Constant(0)), qbe.Jmp("start"), qbe.Ret()]))
+
+    assert peephole.optimize(f) == {"dead-after-ret": 2}
+    assert statements(f) == [["ret 0"]]
+
+
+def test_dead_after_jmp():
+    f = function(
+        ("start", [qbe.Jmp("end"), qbe.Ret(qbe.Constant(1))]),
+        ("middle", [qbe.Ret(qbe.Constant(2))]),
+        ("end", [qbe.Ret(qbe.Constant(0))]),
+    )
+
+    assert peephole.optimize(f) == {"dead-after-jmp": 1}
+    assert statements(f)[0] == ["jmp @end"]
+
+
+def test_dead_after_jnz():
+    f = function(
+        ("start", [qbe.Jnz(x, "a", "b"), qbe.Ret(qbe.Constant(1))]),
+        ("a", [qbe.Ret(qbe.Constant(2))]),
+        ("b", [qbe.Ret(qbe.Constant(3))]),
+        args=[(qbe.Word, x)],
+    )
+
+    assert peephole.optimize(f) == {"dead-after-jnz": 1}
+    assert statements(f)[0] == ["jnz %x, @a, @b"]
+
+
+def test_copy_forward():
+    f = function(
+        ("start", [qbe.Assign(y, qbe.Word, qbe.Copy(x)), qbe.Ret(y)]),
+        args=[(qbe.Word, x)],
+    )
+
+    assert peephole.optimize(f) == {"copy-forward": 1}
+    assert statements(f) == [["ret %x"]]
+
+
+def test_copy_forward_keeps_other_uses():
+    f = function(
+        ("start", [qbe.Assign(y, qbe.Word, qbe.Copy(x)), qbe.Assign(c, qbe.Word, qbe.Add(y, y)), qbe.Ret(c)]),
+        args=[(qbe.Word, x)],
+    )
+
+    assert peephole.optimize(f) == {}
+
+
+def test_copy_into():
+    f = function(
+        ("start", [
+            qbe.Assign(c, qbe.Word, qbe.Add(x, x)),
+            qbe.Assign(y, qbe.Word, qbe.Copy(c)),
+            qbe.Ret(y),
+            qbe.Ret(y),
+        ]),
+        args=[(qbe.Word, x)],
+    )
+
+    assert peephole.optimize(f) == {"copy-into": 1, "dead-after-ret": 1}
+    assert statements(f) == [["%y =w add %x, %x", "ret %y"]]
+
+
+def test_cmp_jnz_constant():
+    f = function(
+        ("start", [qbe.Assign(c, qbe.Word, qbe.Cmp(qbe.Word, qbe.Comparison.SLT, qbe.Constant(2), qbe.Constant(1))), qbe.Jnz(c, "a", "b")]),
+        ("a", [qbe.Ret(qbe.Constant(1))]),
+        ("b", [qbe.Ret(qbe.Constant(0))]),
+    )
+
+    assert peephole.optimize(f) == {"cmp-jnz": 1}
+    assert statements(f)[0] == ["jmp @b"]
+
+
+def test_cmp_jnz_not_zero():
+    f = function(
+        ("start", [qbe.Assign(c, qbe.Word, qbe.Cmp(qbe.Word, qbe.Comparison.SNE, x, qbe.Constant(0))), qbe.Jnz(c, "a", "b")]),
+        ("a", [qbe.Ret(qbe.Constant(1))]),
+        ("b", [qbe.Ret(qbe.Constant(0))]),
+        args=[(qbe.Word, x)],
+    )
+
+    assert peephole.optimize(f) == {"cmp-jnz": 1}
+    assert statements(f)[0] == ["jnz %x, @a, @b"]
+
+
+def test_cmp_jnz_needs_an_assign():
+    cmp = qbe.Cmp(qbe.Word, qbe.Comparison.SNE, x, qbe.Constant(0))
+    f = function(
+        ("start", [cmp, qbe.Jnz(x, "a", "b")]),
+        ("a", [qbe.Ret(qbe.Constant(1))]),
+        ("b", [qbe.Ret(qbe.Constant(0))]),
+        args=[(qbe.Word, x)],
+    )
+
+    assert peephole.optimize(f) == {}
+
+
+def test_jnz_same():
+    f = function(
+        ("start", [qbe.Jnz(x, "a", "a")]),
+        ("a", [qbe.Ret(qbe.Constant(0))]),
+        args=[(qbe.Word, x)],
+    )
+
+    # The jmp it becomes then goes to the next block
+    assert peephole.optimize(f) == {"jnz-same": 1, "jmp-next": 1}
+    assert statements(f) == [[], ["ret 0"]]
+
+
+def test_jnz_constant():
+    f = function(
+        ("start", [qbe.Jnz(qbe.Constant(0), "a", "b")]),
+        ("a", [qbe.Ret(qbe.Constant(1))]),
+        ("b", [qbe.Ret(qbe.Constant(0))]),
+    )
+
+    assert peephole.optimize(f) == {"jnz-constant": 1}
+    assert statements(f)[0] == ["jmp @b"]
+
+
+def test_jmp_next():
+    f = function(
+        ("start", [qbe.Jmp("next")]),
+        ("next", [qbe.Jmp("start")]),
+    )
+
+    assert peephole.optimize(f) == {"jmp-next": 1}
+    assert statements(f) == [[], ["jmp @start"]]
+
+
+def test_jmp_next_only_at_end_of_block():
+    f = function(
+        ("start", [qbe.Jmp("next"), qbe.Ret(qbe.Constant(1))]),
+        ("next", [qbe.Ret(qbe.Constant(0))]),
+    )
+
+    # Removing the jump first would let the dead return run
+    assert peephole.optimize(f) == {"dead-after-jmp": 1, "jmp-next": 1}
+    assert statements(f) == [[], ["ret 0"]]
+
+
+def test_removed_uses_unlock_matches():
+    f = function(
+        ("start", [qbe.Assign(y, qbe.Word, qbe.Copy(x)), qbe.Ret(y), qbe.Ret(y)]),
+        args=[(qbe.Word, x)],
+    )
+
+    assert peephole.optimize(f) == {"dead-after-ret": 1, "copy-forward": 1}
+    assert statements(f) == [["ret %x"]]
+    assert peephole.optimize(f) == {}
+
+
+def test_removed_uses_unlock_matches_in_earlier_blocks():
+    f = function(
+        ("start", [qbe.Assign(c, qbe.Word, qbe.Copy(x)), qbe.Jnz(c, "a", "b")]),
+        ("a", [qbe.Ret(qbe.Constant(0)), qbe.Ret(c)]),
+        ("b", [qbe.Ret(qbe.Constant(1))]),
+        args=[(qbe.Word, x)],
+    )
+
+    assert peephole.optimize(f) == {"dead-after-ret": 1, "copy-forward": 1}
+    assert statements(f)[0] == ["jnz %x, @a, @b"]
+    assert peephole.optimize(f) == {}
+
+
+def test_linear_in_dead_code():
+    def run(n):
+        f = function(("start", [qbe.Ret(qbe.Constant(0))] + [qbe.Jmp("start")] * n))
+        start = time.perf_counter()
+        assert peephole.optimize(f) == {"dead-after-ret": n}
+        return time.perf_counter() - start
+
+    run(1000)
+
+    # Quadratic time would make this about 100 times slower
+    assert run(100_000) < run(10_000) * 30
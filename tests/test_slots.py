@@ -0,0 +1,127 @@
+import qbe
+import slots
+
+
+def function(*blocks):
+    return qbe.Function(
+        linkage=qbe.Linkage.private(),
+        name="f",
+        args=[(qbe.Word, qbe.Temporary("x"))],
+        return_type=None,
+        body=[qbe.Block(label, list(statements)) for label, statements in blocks],
+    )
+
+
+def alloc(name, instr):
+    return qbe.Assign(qbe.Temporary(name), qbe.Long, instr)
+
+
+def store(name):
+    return qbe.Store(qbe.Word, qbe.Temporary("x"), qbe.Temporary(name))
+
+
+def load(name, into):
+    return qbe.Assign(qbe.Temporary(into), qbe.Word, qbe.Load(qbe.Word, qbe.Temporary(name)))
+
+
+def allocs(f):
+    return [str(s) for s in f.body[0].statements if "alloc" in str(s)]
+
+
+def test_disjoint_ranges_share():
+    f = function(("start", [
+        alloc("a", qbe.Alloc4(4)), alloc("b", qbe.Alloc4(4)),
+        store("a"), load("a", "v"),
+        store("b"), load("b", "w"),
+        qbe.Ret(),
+    ]))
+
+    assert slots.color_slots(f) == 4
+    assert allocs(f) == ["%a =l alloc4 4"]
+    assert str(f.body[0].statements[3]) == "storew %x, %a"
+
+
+def test_overlapping_ranges_kept_apart():
+    f = function(("start", [
+        alloc("a", qbe.Alloc4(4)), alloc("b", qbe.Alloc4(4)),
+        store("a"), store("b"),
+        load("a", "v"), load("b", "w"),
+        qbe.Ret(),
+    ]))
+
+    assert slots.color_slots(f) == 0
+    assert allocs(f) == ["%a =l alloc4 4", "%b =l alloc4 4"]
+
+
+def test_slot_live_in_a_loop_is_widened():
+    # %a is stored before the loop and read at the top of it, so it has to
+    # survive the stores to %b at the bottom of the previous trip
+    f = function(
+        ("start", [alloc("a", qbe.Alloc4(4)), alloc("b", qbe.Alloc4(4)), store("a")]),
+        ("loop", [load("a", "v"), store("b"), load("b", "w"), qbe.Jnz(qbe.Temporary("w"), "loop", "done")]),
+        ("done", [qbe.Ret()]),
+    )
+
+    assert slots.color_slots(f) == 0
+    assert allocs(f) == ["%a =l alloc4 4", "%b =l alloc4 4"]
+
+
+def test_address_passed_to_a_call_escapes():
+    f = function(("start", [
+        alloc("a", qbe.Alloc4(4)), alloc("b", qbe.Alloc4(4)),
+        qbe.Call("g", [(qbe.Long, qbe.Temporary("a"))]), store("a"),
+        store("b"), load("b", "w"),
+        qbe.Ret(),
+    ]))
+
+    assert slots.color_slots(f) == 0
+    assert len(allocs(f)) == 2
+
+
+def test_address_arithmetic_escapes():
+    f = function(("start", [
+        alloc("a", qbe.Alloc8(8)), alloc("b", qbe.Alloc8(8)),
+        store("a"), qbe.Assign(qbe.Temporary("p"), qbe.Long, qbe.Add(qbe.Temporary("a"), qbe.Constant(4))),
+        store("b"), load("b", "w"),
+        qbe.Ret(),
+    ]))
+
+    assert slots.color_slots(f) == 0
+    assert len(allocs(f)) == 2
+
+
+def test_smaller_alignment_fits_in_a_larger_area():
+    f = function(("start", [
+        alloc("a", qbe.Alloc16(16)), alloc("b", qbe.Alloc4(4)),
+        store("a"), load("a", "v"),
+        store("b"), load("b", "w"),
+        qbe.Ret(),
+    ]))
+
+    assert slots.color_slots(f) == 4
+    assert allocs(f) == ["%a =l alloc16 16"]
+
+
+def test_larger_alignment_never_fits_in_a_smaller_area():
+    f = function(("start", [
+        alloc("a", qbe.Alloc4(16)), alloc("b", qbe.Alloc16(16)),
+        store("a"), load("a", "v"),
+        store("b"), load("b", "w"),
+        qbe.Ret(),
+    ]))
+
+    assert slots.color_slots(f) == 0
+    assert allocs(f) == ["%a =l alloc4 16", "%b =l alloc16 16"]
+
+
+def test_irreducible_flow_is_skipped():
+    # @left and @right jump to each other, and both can be entered from @start
+    f = function(
+        ("start", [alloc("a", qbe.Alloc4(4)), alloc("b", qbe.Alloc4(4)), qbe.Jnz(qbe.Temporary("x"), "left", "right")]),
+        ("left", [store("a"), load("a", "v"), qbe.Jnz(qbe.Temporary("v"), "right", "done")]),
+        ("right", [store("b"), load("b", "w"), qbe.Jnz(qbe.Temporary("w"), "left", "done")]),
+        ("done", [qbe.Ret()]),
+    )
+
+    assert slots.color_slots(f) == 0
+    assert len(allocs(f)) == 2